@@ -0,0 +1,98 @@
+"""批量计算命令行工具
+
+对一个项目的全部 items（或指定 keys）批量计算一列 ID 的命中结果，用于离线人群预计算。
+
+用法：
+    python -m app.bulk --project main --input user_ids.txt --output result.csv
+    cat user_ids.txt | python -m app.bulk --project main --keys new_chat_ui,ai_assistant --format jsonl
+
+输入每行一个 ID；输出 CSV（id 列 + 每个 item 一列 0/1）或 JSON Lines。
+"""
+import argparse
+import asyncio
+import csv
+import json
+import sys
+from typing import List, Dict, Any, Optional, TextIO
+from app.services.bulk import iter_bulk_chunks
+
+
+async def load_project_items(project: str) -> List[Dict[str, Any]]:
+    """从数据库读取项目的 items"""
+    from app.database import connect_to_mongo, close_mongo_connection, get_database
+
+    await connect_to_mongo()
+    try:
+        project_doc = await get_database().projects.find_one({"name": project})
+    finally:
+        await close_mongo_connection()
+
+    if not project_doc:
+        raise SystemExit(f"项目 '{project}' 不存在")
+    return project_doc.get("items", [])
+
+
+def _read_ids(stream: TextIO):
+    for line in stream:
+        value = line.strip()
+        if value:
+            yield value
+
+
+def run(
+    items: List[Dict[str, Any]],
+    input_stream: TextIO,
+    output_stream: TextIO,
+    field: str = "user_id",
+    keys: Optional[List[str]] = None,
+    output_format: str = "csv",
+    chunk_size: int = 100_000
+):
+    """批量计算并逐块写出结果"""
+    if keys:
+        wanted = {k.lower() for k in keys}
+        items = [item for item in items if item.get("name", "").lower() in wanted]
+
+    writer = csv.writer(output_stream) if output_format == "csv" else None
+    header_written = False
+
+    for names, chunk, matrix in iter_bulk_chunks(items, _read_ids(input_stream), field, chunk_size):
+        if writer is not None:
+            if not header_written:
+                writer.writerow([field] + names)
+                header_written = True
+            rows = matrix.astype("u1").tolist()
+            writer.writerows([value] + row for value, row in zip(chunk, rows))
+        else:
+            for value, row in zip(chunk, matrix.tolist()):
+                output_stream.write(json.dumps({field: value, "results": dict(zip(names, row))}, ensure_ascii=False))
+                output_stream.write("\n")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="批量计算 Feature Gate 命中结果")
+    parser.add_argument("--project", required=True, help="项目名称")
+    parser.add_argument("--input", default="-", help="ID 列表文件，每行一个（默认标准输入）")
+    parser.add_argument("--output", default="-", help="输出文件（默认标准输出）")
+    parser.add_argument("--field", default="user_id", help="ID 对应的字段名（默认 user_id）")
+    parser.add_argument("--keys", default="", help="只计算指定的 keys，逗号分隔（默认全部）")
+    parser.add_argument("--format", choices=["csv", "jsonl"], default="csv", help="输出格式")
+    parser.add_argument("--chunk-size", type=int, default=100_000, help="每块计算的 ID 数量")
+    args = parser.parse_args(argv)
+
+    items = asyncio.run(load_project_items(args.project))
+    keys = [k.strip() for k in args.keys.split(",") if k.strip()]
+
+    input_stream = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    output_stream = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8", newline="")
+    try:
+        run(items, input_stream, output_stream, args.field, keys, args.format, args.chunk_size)
+    finally:
+        if input_stream is not sys.stdin:
+            input_stream.close()
+        if output_stream is not sys.stdout:
+            output_stream.close()
+
+
+if __name__ == "__main__":
+    main()
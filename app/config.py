@@ -24,12 +24,41 @@ class Settings(BaseSettings):
     jwt_secret_key: str = "your-secret-key-change-in-production"
     jwt_algorithm: str = "HS256"
     jwt_expire_minutes: int = 60 * 24 * 7  # 7 days
+    jwt_cache_maxsize: int = 1024  # 已验证 token 的缓存数量
+    
+    # Password
+    password_hash_workers: int = 2  # bcrypt 线程数（并发上限），超出的登录 / 改密请求排队等待
     
     # Session
     session_secret_key: str = "session-secret-key-change-in-production"
     
     # Cache
-    cache_ttl_seconds: int = 60
+    cache_maxsize: int = 1000  # 最多缓存的项目数
+    cache_ttl_seconds: int = 60  # 软过期：超过后在后台刷新，刷新完成前继续返回旧值
+    cache_hard_ttl_seconds: int = 600  # 硬过期：超过后必须同步查询数据库
+    cache_ttl_jitter: float = 0.1  # 软过期时间的随机抖动比例，避免同时创建的缓存同时刷新
+    cache_stale_while_revalidate: bool = True  # 关闭后缓存在 cache_ttl_seconds 后直接过期
+    cache_negative_ttl_seconds: int = 5  # 不存在的项目（404）的缓存时间
+    cache_watch_enabled: bool = True  # 通过 MongoDB Change Streams 在所有 worker 间同步缓存（需要副本集）
+    user_cache_maxsize: int = 1000  # 最多缓存的用户数
+    user_cache_ttl_seconds: int = 30  # 用户信息缓存时间（其他 worker 上的用户变更最多延迟该时间生效）
+    hash_cache_maxsize: int = 100000  # 字段哈希 LRU 的条目数（每条约 200 字节），0 为关闭
+    
+    # Stream
+    fg_stream_heartbeat_seconds: int = 15  # /api/fg/stream 心跳间隔，同时兜底检查配置版本
+    
+    # Metrics
+    metrics_max_series: int = 1000  # /metrics 中带项目 / key 标签的指标最多保留的标签组合数，超出的计入 "__other__"
+    
+    # Usage
+    usage_flush_interval_seconds: float = 5  # 功能项使用统计写入 MongoDB 的间隔，进程被强制终止时最多丢失该时间内的计数
+    
+    # Trace
+    fg_trace_sample_rate: float = 0.0  # 按比例记录 /api/fg/check 的条件计算追踪（0 为关闭，例如 0.001 为千分之一）
+    fg_trace_buffer_size: int = 200  # 每个 worker 保留的最近采样追踪条数
+    
+    # Snapshot
+    snapshot_full_interval: int = 20  # 每隔多少个快照保存一次完整基准，其余保存为压缩差异
     
     class Config:
         env_file = ".env"
@@ -1,5 +1,7 @@
 """MongoDB 数据库连接管理"""
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import PyMongoError
 from app.config import get_settings
 
 settings = get_settings()
@@ -8,6 +10,29 @@ settings = get_settings()
 client: AsyncIOMotorClient = None
 db: AsyncIOMotorDatabase = None
 
+# 索引定义：集合 -> [(索引字段, 选项)]
+INDEXES = {
+    # fg 缓存未命中时按名称查询项目
+    "projects": [
+        ([("name", ASCENDING)], {"name": "name_unique", "unique": True}),
+    ],
+    # 每个认证请求按用户名查询用户
+    "users": [
+        ([("username", ASCENDING)], {"name": "username_unique", "unique": True}),
+    ],
+    # 按项目 / 全部快照分页查询，按 (updated_at, _id) 倒序做 keyset 分页
+    "snapshots": [
+        ([("project_id", ASCENDING), ("updated_at", DESCENDING), ("_id", DESCENDING)], {"name": "project_id_updated_at_id"}),
+        ([("updated_at", DESCENDING), ("_id", DESCENDING)], {"name": "updated_at_id"}),
+        # 创建快照时按内容哈希去重
+        ([("project_id", ASCENDING), ("content_hash", ASCENDING)], {"name": "project_id_content_hash"}),
+    ],
+    # 功能项使用统计：每个 (项目, item) 一个文档，按项目查询
+    "flag_usage": [
+        ([("project", ASCENDING), ("key", ASCENDING)], {"name": "project_key_unique", "unique": True}),
+    ],
+}
+
 
 async def connect_to_mongo():
     """连接到 MongoDB"""
@@ -17,6 +42,32 @@ async def connect_to_mongo():
     print(f"Connected to MongoDB: {settings.mongo_url}")
 
 
+async def ensure_indexes():
+    """创建索引（幂等，已存在的索引不会重复创建）"""
+    for collection_name, indexes in INDEXES.items():
+        collection = db[collection_name]
+        for keys, options in indexes:
+            try:
+                await collection.create_index(keys, **options)
+            except PyMongoError as e:
+                # 例如已有重复数据导致唯一索引创建失败，不阻止应用启动
+                print(f"创建索引失败 {collection_name}.{options['name']}: {e}")
+
+
+async def report_index_usage():
+    """输出各集合索引的使用次数（$indexStats）"""
+    for collection_name in INDEXES:
+        try:
+            stats = await db[collection_name].aggregate([{"$indexStats": {}}]).to_list(None)
+        except Exception as e:
+            # 仅用于诊断输出，失败不影响启动
+            print(f"获取索引使用情况失败 {collection_name}: {e}")
+            continue
+        for stat in stats:
+            accesses = stat.get("accesses", {})
+            print(f"索引使用 {collection_name}.{stat['name']}: {accesses.get('ops', 0)} 次（自 {accesses.get('since')}）")
+
+
 async def close_mongo_connection():
     """关闭 MongoDB 连接"""
     global client
@@ -5,6 +5,7 @@ from fastapi.templating import Jinja2Templates
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from app.database import get_database
 from app.services.auth import decode_access_token
+from app.services.cache import get_cached_user, set_cached_user
 from app.config import get_settings
 
 # Jinja2 模板
@@ -27,6 +28,16 @@ async def get_db() -> AsyncIOMotorDatabase:
     return get_database()
 
 
+async def _get_user(db: AsyncIOMotorDatabase, username: str) -> Optional[dict]:
+    """按用户名获取用户（优先读缓存）"""
+    user = get_cached_user(username)
+    if user is None:
+        user = await db.users.find_one({"username": username})
+        if user is not None:
+            set_cached_user(username, user)
+    return user
+
+
 async def get_current_user(
     access_token: Optional[str] = Cookie(None),
     db: AsyncIOMotorDatabase = Depends(get_db)
@@ -52,8 +63,8 @@ async def get_current_user(
             detail="无效的认证凭证"
         )
     
-    # 从数据库获取用户信息
-    user = await db.users.find_one({"username": username})
+    # 获取用户信息（缓存未命中时查询数据库）
+    user = await _get_user(db, username)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -91,8 +102,7 @@ async def get_optional_user(
     if not username:
         return None
     
-    user = await db.users.find_one({"username": username})
-    return user
+    return await _get_user(db, username)
 
 
 def flash(request: Request, message: str, category: str = "info"):
@@ -3,9 +3,12 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from starlette.middleware.sessions import SessionMiddleware
-from app.database import connect_to_mongo, close_mongo_connection, get_database
-from app.routers import auth, projects, snapshots, admin, fg, pages
-from app.services.auth import get_password_hash
+from app.database import connect_to_mongo, close_mongo_connection, get_database, ensure_indexes, report_index_usage
+from app.routers import auth, projects, snapshots, admin, fg, pages, metrics
+from app.services.auth import get_password_hash_async
+from app.services.hash import configure_hash_cache
+from app.services.usage import start_usage_flusher, stop_usage_flusher
+from app.services.watcher import start_project_watcher, stop_project_watcher
 from app.config import get_settings
 from datetime import datetime
 
@@ -16,10 +19,18 @@ settings = get_settings()
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
     # 启动时
+    configure_hash_cache(settings.hash_cache_maxsize)
     await connect_to_mongo()
+    await ensure_indexes()
+    await report_index_usage()
     await init_admin_user()
+    if settings.cache_watch_enabled:
+        start_project_watcher(get_database())
+    start_usage_flusher(get_database())
     yield
     # 关闭时
+    await stop_project_watcher()
+    await stop_usage_flusher(get_database())  # 写入剩余的使用统计
     await close_mongo_connection()
 
 
@@ -43,6 +54,7 @@ app.include_router(projects.router)
 app.include_router(snapshots.router)
 app.include_router(admin.router)
 app.include_router(fg.router)
+app.include_router(metrics.router)
 
 
 async def init_admin_user():
@@ -55,7 +67,7 @@ async def init_admin_user():
         # 创建初始管理员
         admin_user = {
             "username": settings.admin_username,
-            "hashed_password": get_password_hash(settings.admin_password),
+            "hashed_password": await get_password_hash_async(settings.admin_password),
             "role": "admin",
             "created_by": "system",
             "created_at": datetime.utcnow()
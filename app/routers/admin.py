@@ -3,10 +3,12 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from typing import List
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 from datetime import datetime
 from app.deps import get_db, get_current_admin
 from app.schemas.user import UserCreate, UserResponse, PasswordChange
-from app.services.auth import get_password_hash, verify_password
+from app.services.auth import get_password_hash_async, verify_password_async
+from app.services.cache import invalidate_user_cache
 
 router = APIRouter(prefix="/api/admin", tags=["admin"])
 
@@ -45,13 +47,23 @@ async def create_user(
     
     user = {
         "username": user_data.username,
-        "hashed_password": get_password_hash(user_data.password),
+        "hashed_password": await get_password_hash_async(user_data.password),
         "role": user_data.role,
         "created_by": current_admin["username"],
         "created_at": datetime.utcnow()
     }
     
-    result = await db.users.insert_one(user)
+    try:
+        result = await db.users.insert_one(user)
+    except DuplicateKeyError:
+        # 并发创建同名用户，由唯一索引拦截
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="用户名已存在"
+        )
+    
+    # 清除用户缓存
+    invalidate_user_cache(user["username"])
     
     return {
         "id": str(result.inserted_id),
@@ -85,6 +97,9 @@ async def delete_user(
     
     await db.users.delete_one({"_id": ObjectId(user_id)})
     
+    # 清除用户缓存，已删除用户的登录状态立即失效
+    invalidate_user_cache(user["username"])
+    
     return {"message": "用户已删除"}
 
 
@@ -106,17 +121,21 @@ async def change_password(
     
     # 如果是修改自己的密码，需要验证旧密码
     if str(user["_id"]) == str(current_admin["_id"]) and password_data.old_password:
-        if not verify_password(password_data.old_password, user["hashed_password"]):
+        if not await verify_password_async(password_data.old_password, user["hashed_password"]):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="旧密码不正确"
             )
     
     # 更新密码
+    hashed_password = await get_password_hash_async(password_data.new_password)
     await db.users.update_one(
         {"_id": ObjectId(user_id)},
-        {"$set": {"hashed_password": get_password_hash(password_data.new_password)}}
+        {"$set": {"hashed_password": hashed_password}}
     )
     
+    # 清除用户缓存
+    invalidate_user_cache(user["username"])
+    
     return {"message": "密码已更新"}
 
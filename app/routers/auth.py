@@ -4,7 +4,7 @@ from fastapi.responses import RedirectResponse
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from app.deps import get_db, get_current_user, flash
 from app.schemas.user import UserLogin, Token, UserResponse
-from app.services.auth import verify_password, create_access_token
+from app.services.auth import verify_password_async, create_access_token
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
@@ -24,7 +24,7 @@ async def login(
         return RedirectResponse(url="/login", status_code=303)
     
     # 验证密码
-    if not verify_password(password, user["hashed_password"]):
+    if not await verify_password_async(password, user["hashed_password"]):
         flash(request, "用户名或密码错误", "error")
         return RedirectResponse(url="/login", status_code=303)
     
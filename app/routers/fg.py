@@ -1,15 +1,46 @@
 """Feature Gate 查询接口"""
-from fastapi import APIRouter, Depends, HTTPException, status
+import asyncio
+import random
+import time
+from fastapi import APIRouter, Depends, HTTPException, status, Header, Request, Response
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from pydantic import BaseModel
-from typing import Optional, List, Dict
-from app.deps import get_db
-from app.services.cache import get_cached_item, set_cached_item
+from typing import Any, AsyncIterator, Optional, List, Dict
+from app.config import get_settings
+from app.deps import get_db, get_current_admin
+from app.services.broadcast import subscribe
+from app.services.cache import get_or_load_project
+from app.services.fastjson import dumps as json_dumps
 from app.services.evaluator import evaluate_conditions, evaluate_condition_groups
+from app.services.metrics import check_requests, compile_seconds, evaluation_seconds, get_requests, mongo_fetch_seconds
+from app.services.compiler import CompiledItem, CompiledProject, compile_item, compile_project
+from app.services.usage import record_usage
+from app.services.tracing import explain_item, get_sampled_traces, record_sample, sample_rate as trace_sample_rate
 from app.schemas.project import Item
 
 router = APIRouter(prefix="/api/fg", tags=["feature-gate"])
 
+settings = get_settings()
+
+# SSE 心跳（注释行，客户端忽略）及项目被删除时的事件
+SSE_HEARTBEAT = b": ping\n\n"
+SSE_DELETED = b"event: deleted\ndata: {}\n\n"
+
+# /check、/get 的响应模板：只有 key（以及 value）需要在请求时序列化，
+# 拼接后直接返回字节串，不构建 Pydantic 模型、不做 response_model 校验
+# （输出与 FGCheckResponse / FGGetResponse 序列化结果一致）
+_CHECK_ENABLED_PREFIX = b'{"enabled":true,"key":'
+_CHECK_DISABLED_PREFIX = b'{"enabled":false,"key":'
+_GET_EMPTY_PREFIX = b'{"value":"","key":'
+_GET_VALUE_PREFIX = b'{"value":'
+_GET_KEY_INFIX = b',"key":'
+
+
+def _json_response(body: bytes) -> Response:
+    return Response(content=body, media_type="application/json")
+
 
 class FGCheckRequest(BaseModel):
     """FG 检查请求"""
@@ -18,6 +49,7 @@ class FGCheckRequest(BaseModel):
     user_id: Optional[str] = None
     chat_id: Optional[str] = None
     email: Optional[str] = None
+    explain: bool = False  # 返回条件计算追踪
 
 
 class FGCheckResponse(BaseModel):
@@ -26,9 +58,15 @@ class FGCheckResponse(BaseModel):
     key: str
 
 
+class FGCheckExplainResponse(FGCheckResponse):
+    """FG 检查响应（explain）"""
+    trace: Dict[str, Any]  # 条件计算追踪
+
+
 class FGDebugResponse(BaseModel):
     """调试响应"""
     results: Dict[str, bool]  # key -> enabled
+    traces: Optional[Dict[str, Dict[str, Any]]] = None  # key -> 条件计算追踪，仅 explain 时返回
 
 
 class FGDebugRequest(BaseModel):
@@ -37,6 +75,7 @@ class FGDebugRequest(BaseModel):
     user_id: Optional[str] = None
     chat_id: Optional[str] = None
     email: Optional[str] = None
+    explain: bool = False  # 返回每个 item 的条件计算追踪
 
 
 class FGGetRequest(BaseModel):
@@ -51,10 +90,36 @@ class FGGetResponse(BaseModel):
     key: str
 
 
-@router.post("/debug", response_model=FGDebugResponse)
+class FGEvaluateAllRequest(BaseModel):
+    """批量计算请求 - 计算项目下所有 item"""
+    project: str
+    user_id: Optional[str] = None
+    chat_id: Optional[str] = None
+    email: Optional[str] = None
+
+
+class FGEvaluateRequest(FGEvaluateAllRequest):
+    """批量计算请求 - 只计算指定的 keys"""
+    keys: List[str]
+
+
+class FGEvaluateResult(BaseModel):
+    """单个 item 的计算结果"""
+    enabled: bool
+    value: str
+
+
+class FGEvaluateResponse(BaseModel):
+    """批量计算响应"""
+    results: Dict[str, FGEvaluateResult]  # key -> 结果
+    missing: List[str] = []  # 不存在的 keys
+
+
+@router.post("/debug", response_model=FGDebugResponse, response_model_exclude_none=True)
 async def debug_feature_gate(request: FGDebugRequest):
     """使用 draft 配置检测命中情况（不需要保存）"""
     results = {}
+    traces = {} if request.explain else None
     
     # 构建上下文
     context = {}
@@ -68,6 +133,13 @@ async def debug_feature_gate(request: FGDebugRequest):
     for item in request.items:
         if not item.name or not item.name.strip():
             continue
+        
+        if traces is not None:
+            # 编译后逐步追踪（结果与下面的计算一致）
+            trace = explain_item(compile_item(item.model_dump()), context)
+            results[item.name] = trace["result"]
+            traces[item.name] = trace
+            continue
             
         # 检查 enabled
         if not item.enabled:
@@ -89,20 +161,55 @@ async def debug_feature_gate(request: FGDebugRequest):
         
         results[item.name] = result
     
-    return FGDebugResponse(results=results)
+    return FGDebugResponse(results=results, traces=traces)
+
 
+def _query_params_doc(required: List[str], optional: List[str] = ()) -> dict:
+    """OpenAPI 中声明的查询参数（处理函数直接读取 request.query_params，不由 FastAPI 解析）"""
+    return {"parameters": [
+        {"name": name, "in": "query", "required": name in required, "schema": {"type": "string"}}
+        for name in [*required, *optional]
+    ]}
 
-@router.get("/check", response_model=FGCheckResponse)
+
+def _required_queries(query_params, *names: str) -> List[str]:
+    """读取必填查询参数，缺失时返回与 FastAPI 参数校验相同的 422 响应"""
+    values = [query_params.get(name) for name in names]
+    if None in values:
+        raise RequestValidationError([
+            {"type": "missing", "loc": ("query", name), "msg": "Field required", "input": None}
+            for name, value in zip(names, values) if value is None
+        ])
+    return values
+
+
+# explain 查询参数的取值
+_EXPLAIN_VALUES = frozenset(("1", "true", "yes", "on"))
+
+
+# GET /check、/get 是最热的接口：FastAPI 逐个解析声明的查询参数占了处理时间的大部分，
+# 这里直接从 request.query_params 读取（均为字符串，无需类型转换），语义与声明参数时一致
+@router.get(
+    "/check",
+    response_model=FGCheckResponse,
+    openapi_extra=_query_params_doc(["project", "key"], ["user_id", "chat_id", "email", "explain"])
+)
 async def check_feature_gate(
-    project: str,
-    key: str,
-    user_id: Optional[str] = None,
-    chat_id: Optional[str] = None,
-    email: Optional[str] = None,
+    request: Request,
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
-    """检查功能是否对特定用户生效（GET 请求）"""
-    return await _check_feature_gate(project, key, user_id, chat_id, email, db)
+    """检查功能是否对特定用户生效（GET 请求），带 explain 参数时响应为 FGCheckExplainResponse"""
+    query_params = request.query_params
+    project, key = _required_queries(query_params, "project", "key")
+    return await _check_feature_gate(
+        project,
+        key,
+        query_params.get("user_id"),
+        query_params.get("chat_id"),
+        query_params.get("email"),
+        db,
+        "explain" in query_params and query_params["explain"].lower() in _EXPLAIN_VALUES
+    )
 
 
 @router.post("/check", response_model=FGCheckResponse)
@@ -110,65 +217,24 @@ async def check_feature_gate_post(
     request: FGCheckRequest,
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
-    """检查功能是否对特定用户生效（POST 请求）"""
+    """检查功能是否对特定用户生效（POST 请求），explain=true 时响应为 FGCheckExplainResponse"""
     return await _check_feature_gate(
         request.project,
         request.key,
         request.user_id,
         request.chat_id,
         request.email,
-        db
+        db,
+        request.explain
     )
 
 
-async def _check_feature_gate(
-    project: str,
-    key: str,
+def _build_context(
     user_id: Optional[str],
     chat_id: Optional[str],
-    email: Optional[str],
-    db: AsyncIOMotorDatabase
-) -> FGCheckResponse:
-    """Feature Gate 检查核心逻辑"""
-    
-    # 1. 尝试从缓存获取
-    cached_item = get_cached_item(project, key)
-    
-    if cached_item is None:
-        # 2. 缓存未命中，从数据库查询
-        # 首先找到项目
-        project_doc = await db.projects.find_one({"name": project})
-        if not project_doc:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"项目 '{project}' 不存在"
-            )
-        
-        # 在项目的 items 数组中查找（大小写不敏感）
-        items = project_doc.get("items", [])
-        key_lower = key.lower()
-        item = next((i for i in items if i.get("name", "").lower() == key_lower), None)
-        
-        if not item:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"功能项 '{key}' 不存在"
-            )
-        
-        # 缓存 item（使用小写的 key 作为缓存键）
-        cached_item = {
-            "enabled": item.get("enabled", True),
-            "value": item.get("value", ""),
-            "conditions": item.get("conditions", []),
-            "condition_groups": item.get("condition_groups", [])
-        }
-        set_cached_item(project, key_lower, cached_item)
-    
-    # 3. 检查 enabled 开关
-    if not cached_item["enabled"]:
-        return FGCheckResponse(enabled=False, key=key)
-    
-    # 4. 构建上下文
+    email: Optional[str]
+) -> Dict[str, str]:
+    """构建条件计算上下文"""
     context = {}
     if user_id:
         context["user_id"] = user_id
@@ -176,32 +242,146 @@ async def _check_feature_gate(
         context["chat_id"] = chat_id
     if email:
         context["email"] = email
+    return context
+
+
+async def _load_compiled_project(
+    project: str,
+    db: AsyncIOMotorDatabase
+) -> Optional[CompiledProject]:
+    """从数据库查询整个项目并编译，项目不存在时返回 None"""
+    started = time.perf_counter_ns()
+    project_doc = await db.projects.find_one({"name": project})
+    fetched = time.perf_counter_ns()
+    mongo_fetch_seconds.observe_ns(fetched - started)
+    if not project_doc:
+        return None
+    compiled_project = compile_project(project_doc)
+    compile_seconds.observe_ns(time.perf_counter_ns() - fetched)
+    return compiled_project
+
+
+async def _get_compiled_project(
+    project: str,
+    db: AsyncIOMotorDatabase
+) -> CompiledProject:
+    """
+    获取编译后的项目快照
+    
+    优先读缓存；未命中时查询一次数据库并编译整个项目，
+    并发未命中只查询一次，不存在的项目会被短暂缓存
+    """
+    compiled_project = await get_or_load_project(
+        project,
+        lambda name: _load_compiled_project(name, db)
+    )
+    if compiled_project is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"项目 '{project}' 不存在"
+        )
+    return compiled_project
+
+
+async def _get_compiled_item(
+    project: str,
+    key: str,
+    db: AsyncIOMotorDatabase
+) -> CompiledItem:
+    """获取编译后的 item（大小写不敏感）"""
+    compiled_project = await _get_compiled_project(project, db)
+    
+    cached_item = compiled_project.get_item(key)
+    if cached_item is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"功能项 '{key}' 不存在"
+        )
+    return cached_item
+
+
+async def _check_feature_gate(
+    project: str,
+    key: str,
+    user_id: Optional[str],
+    chat_id: Optional[str],
+    email: Optional[str],
+    db: AsyncIOMotorDatabase,
+    explain: bool = False
+) -> Response:
+    """Feature Gate 检查核心逻辑（响应格式同 FGCheckResponse）"""
     
-    # 5. 计算条件
-    condition_groups = cached_item.get("condition_groups", [])
-    conditions = cached_item.get("conditions", [])
+    # 1. 获取编译后的 item
+    cached_item = await _get_compiled_item(project, key, db)
     
-    # 优先使用 condition_groups（分组逻辑），否则回退到 conditions（向后兼容）
-    if condition_groups:
-        # 分组逻辑：组间 OR，组内按各组的 logic 配置
-        result = evaluate_condition_groups(condition_groups, context)
-    elif conditions:
-        # 向后兼容：使用原有的 conditions，AND 逻辑
-        result = evaluate_conditions(conditions, context)
-    else:
-        # 没有任何条件，直接返回 enabled
-        return FGCheckResponse(enabled=True, key=key)
+    # explain 或被采样时走追踪路径；采样关闭时这里只是一次全局变量判断
+    if explain or (trace_sample_rate and random.random() < trace_sample_rate):
+        return _traced_check(project, key, cached_item, _build_context(user_id, chat_id, email), explain)
     
-    return FGCheckResponse(enabled=result, key=key)
+    # 2. 检查 enabled 开关
+    if not cached_item.enabled:
+        check_requests.inc((project, cached_item.name, "off"))
+        record_usage(project, cached_item.name, "off")
+        return _json_response(_CHECK_DISABLED_PREFIX + json_dumps(key) + b"}")
+    
+    # 3. 构建上下文
+    context = _build_context(user_id, chat_id, email)
+    
+    # 4. 执行预编译的条件（组间 OR，组内按各组的 logic 配置）
+    started = time.perf_counter_ns()
+    enabled = cached_item.evaluate(context)
+    evaluation_seconds.observe_ns(time.perf_counter_ns() - started)
+    outcome = "true" if enabled else "false"
+    check_requests.inc((project, cached_item.name, outcome))
+    record_usage(project, cached_item.name, outcome)
+    
+    prefix = _CHECK_ENABLED_PREFIX if enabled else _CHECK_DISABLED_PREFIX
+    return _json_response(prefix + json_dumps(key) + b"}")
 
 
-@router.get("/get", response_model=FGGetResponse)
-async def get_feature_value(
+def _traced_check(
     project: str,
     key: str,
+    cached_item: CompiledItem,
+    context: Dict[str, str],
+    explain: bool
+) -> Response:
+    """追踪条件计算；explain 时在响应中返回追踪结果，否则记录为采样追踪"""
+    trace = explain_item(cached_item, context)
+    enabled = trace["result"]
+    outcome = ("true" if enabled else "false") if cached_item.enabled else "off"
+    check_requests.inc((project, cached_item.name, outcome))
+    record_usage(project, cached_item.name, outcome)
+    
+    if explain:
+        response = FGCheckExplainResponse(enabled=enabled, key=key, trace=trace)
+        return _json_response(json_dumps(response.model_dump()))
+    
+    record_sample(project, key, trace)
+    prefix = _CHECK_ENABLED_PREFIX if enabled else _CHECK_DISABLED_PREFIX
+    return _json_response(prefix + json_dumps(key) + b"}")
+
+
+@router.get("/traces")
+async def list_sampled_traces(
+    limit: int = 100,
+    current_admin: dict = Depends(get_current_admin)
+):
+    """最近的采样追踪（当前 worker，新的在前），需要 FG_TRACE_SAMPLE_RATE > 0"""
+    return {"sample_rate": trace_sample_rate, "traces": get_sampled_traces(limit)}
+
+
+@router.get(
+    "/get",
+    response_model=FGGetResponse,
+    openapi_extra=_query_params_doc(["project", "key"])
+)
+async def get_feature_value(
+    request: Request,
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
     """获取功能配置值（GET 请求）"""
+    project, key = _required_queries(request.query_params, "project", "key")
     return await _get_feature_value(project, key, db)
 
 
@@ -218,45 +398,162 @@ async def _get_feature_value(
     project: str,
     key: str,
     db: AsyncIOMotorDatabase
-) -> FGGetResponse:
-    """获取功能配置值核心逻辑"""
+) -> Response:
+    """获取功能配置值核心逻辑（响应格式同 FGGetResponse）"""
     
-    # 1. 尝试从缓存获取
-    cached_item = get_cached_item(project, key)
+    # 1. 获取编译后的 item
+    cached_item = await _get_compiled_item(project, key, db)
+    get_requests.inc((project, cached_item.name))
+    record_usage(project, cached_item.name, "value")
     
-    if cached_item is None:
-        # 2. 缓存未命中，从数据库查询
-        project_doc = await db.projects.find_one({"name": project})
-        if not project_doc:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"项目 '{project}' 不存在"
-            )
-        
-        # 在项目的 items 数组中查找（大小写不敏感）
-        items = project_doc.get("items", [])
-        key_lower = key.lower()
-        item = next((i for i in items if i.get("name", "").lower() == key_lower), None)
-        
-        if not item:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"功能项 '{key}' 不存在"
-            )
-        
-        # 缓存 item（使用小写的 key 作为缓存键）
-        cached_item = {
-            "enabled": item.get("enabled", True),
-            "value": item.get("value", ""),
-            "conditions": item.get("conditions", []),
-            "condition_groups": item.get("condition_groups", [])
-        }
-        set_cached_item(project, key_lower, cached_item)
+    # 2. 检查 enabled 开关，如果关闭则返回空字符串
+    if not cached_item.enabled:
+        return _json_response(_GET_EMPTY_PREFIX + json_dumps(key) + b"}")
     
-    # 3. 检查 enabled 开关，如果关闭则返回空字符串
-    if not cached_item["enabled"]:
-        return FGGetResponse(value="", key=key)
+    # 3. 返回预先序列化的配置值
+    return _json_response(_GET_VALUE_PREFIX + cached_item.value_json + _GET_KEY_INFIX + json_dumps(key) + b"}")
+
+
+@router.get("/config")
+async def get_project_config(
+    project: str,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """
+    获取项目的规范化配置（供客户端 SDK 本地计算）
+    
+    响应体为 {"project", "version", "items"}，ETag 为配置版本号；
+    请求带 If-None-Match 且版本未变化时返回 304，不传输配置内容
+    """
+    compiled_project = await _get_compiled_project(project, db)
+    etag = f'"{compiled_project.version}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
     
-    # 4. 返回配置值
-    return FGGetResponse(value=cached_item.get("value", ""), key=key)
+    if if_none_match:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if etag in tags or "*" in tags:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=compiled_project.config, media_type="application/json", headers=headers)
 
+
+@router.get("/stream")
+async def stream_project_config(
+    request: Request,
+    project: str,
+    last_event_id: Optional[str] = Header(None),
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """
+    订阅项目配置变更（Server-Sent Events）
+    
+    连接后立即推送当前配置（event: config，id 为版本号，data 与 /api/fg/config 相同），
+    之后每次配置变更推送新版本；重连时带 Last-Event-ID 且版本未变化则不重复推送。
+    项目被删除时推送 event: deleted 并结束
+    """
+    # 项目不存在时直接返回 404，而不是建立空的事件流
+    await _get_compiled_project(project, db)
+    return StreamingResponse(
+        _config_events(request, project, last_event_id, db),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def _config_events(
+    request: Request,
+    project: str,
+    last_event_id: Optional[str],
+    db: AsyncIOMotorDatabase
+) -> AsyncIterator[bytes]:
+    """
+    配置变更事件流
+    
+    所有订阅者等待同一个项目频道的 Event，变更时一起被唤醒，
+    再通过缓存读取新配置（并发未命中只查询一次数据库）；
+    心跳时也检查一次版本，兜底未收到通知的变更（例如未启用 Change Streams 时其他 worker 的修改）
+    """
+    heartbeat = settings.fg_stream_heartbeat_seconds
+    sent_version = last_event_id
+    
+    with subscribe(project) as channel:
+        # 先取 Event 再读取配置，读取之后发生的变更不会被错过
+        event = channel.event
+        while True:
+            try:
+                compiled_project = await _get_compiled_project(project, db)
+            except HTTPException:
+                yield SSE_DELETED
+                return
+            except Exception as e:
+                # 数据库暂时不可用等，保持连接，下次唤醒或心跳时重试
+                print(f"读取项目 '{project}' 配置失败: {e!r}")
+            else:
+                if compiled_project.version != sent_version:
+                    yield channel.frame(compiled_project)
+                    sent_version = compiled_project.version
+            
+            try:
+                await asyncio.wait_for(event.wait(), heartbeat)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    return
+                yield SSE_HEARTBEAT
+            event = channel.event
+
+
+@router.post("/evaluate_all", response_model=FGEvaluateResponse)
+async def evaluate_all_feature_gates(
+    request: FGEvaluateAllRequest,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """一次计算项目下所有 item 的开关状态和配置值"""
+    compiled_project = await _get_compiled_project(request.project, db)
+    
+    context = _build_context(request.user_id, request.chat_id, request.email)
+    hashes: Dict[str, int] = {}  # 所有 item 共享，每个字段只哈希一次
+    
+    results = {}
+    for compiled in compiled_project.items.values():
+        results[compiled.name] = _evaluate_item(compiled_project.name, compiled, context, hashes)
+    
+    return FGEvaluateResponse(results=results)
+
+
+@router.post("/evaluate", response_model=FGEvaluateResponse)
+async def evaluate_feature_gates(
+    request: FGEvaluateRequest,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """一次计算指定 keys 的开关状态和配置值"""
+    compiled_project = await _get_compiled_project(request.project, db)
+    
+    context = _build_context(request.user_id, request.chat_id, request.email)
+    hashes: Dict[str, int] = {}  # 所有 item 共享，每个字段只哈希一次
+    
+    # 不存在的 key 放入 missing
+    results = {}
+    missing = []
+    for key in request.keys:
+        compiled = compiled_project.get_item(key)
+        if compiled is None:
+            missing.append(key)
+            continue
+        results[key] = _evaluate_item(compiled_project.name, compiled, context, hashes)
+    
+    return FGEvaluateResponse(results=results, missing=missing)
+
+
+def _evaluate_item(
+    project: str,
+    compiled: CompiledItem,
+    context: Dict[str, str],
+    hashes: Dict[str, int]
+) -> FGEvaluateResult:
+    """计算单个 item，语义与 /check、/get 一致（关闭时 value 为空字符串）"""
+    if not compiled.enabled:
+        record_usage(project, compiled.name, "off")
+        return FGEvaluateResult(enabled=False, value="")
+    enabled = compiled.evaluate(context, hashes)
+    record_usage(project, compiled.name, "true" if enabled else "false")
+    return FGEvaluateResult(enabled=enabled, value=compiled.value)
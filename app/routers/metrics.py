@@ -0,0 +1,43 @@
+"""运行指标接口（Prometheus 文本格式）"""
+from fastapi import APIRouter, Response
+from app.services import auth, cache
+from app.services.broadcast import subscriber_count
+from app.services.hash import hash_cache_stats
+from app.services.metrics import render_gauge, render_metrics
+
+router = APIRouter(tags=["metrics"])
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _collect_gauges():
+    """抓取时读取的状态：缓存大小、哈希缓存命中率、SSE 订阅数、bcrypt 线程池排队情况"""
+    stats = auth.password_hash_stats
+    gauges = [
+        render_gauge("fg_cache_projects", "缓存中的项目数", cache.project_cache.currsize),
+        render_gauge("fg_cache_missing_projects", "负缓存中的项目数", cache.missing_project_cache.currsize),
+        render_gauge("fg_cache_inflight_loads", "正在加载的项目数", len(cache._inflight_loads)),
+        render_gauge("fg_user_cache_users", "用户缓存中的用户数", cache.user_cache.currsize),
+        render_gauge("fg_stream_subscribers", "/api/fg/stream 订阅者数", subscriber_count()),
+        render_gauge("fg_password_hash_waiting", "bcrypt 排队中的请求数", stats.waiting),
+        render_gauge("fg_password_hash_running", "bcrypt 执行中的请求数", stats.running),
+        render_gauge("fg_password_hash_max_waiting", "bcrypt 最大排队数", stats.max_waiting),
+        render_gauge("fg_password_hash_completed_total", "bcrypt 累计完成次数", stats.completed, "counter"),
+        render_gauge("fg_password_hash_wait_seconds_total", "bcrypt 累计排队时间", stats.wait_seconds, "counter"),
+        render_gauge("fg_password_hash_run_seconds_total", "bcrypt 累计执行时间", stats.run_seconds, "counter"),
+    ]
+    hash_stats = hash_cache_stats()
+    if hash_stats is not None:
+        gauges += [
+            render_gauge("fg_hash_cache_entries", "字段哈希缓存条目数", hash_stats["size"]),
+            render_gauge("fg_hash_cache_hits_total", "字段哈希缓存命中次数", hash_stats["hits"], "counter"),
+            render_gauge("fg_hash_cache_misses_total", "字段哈希缓存未命中次数（计算 md5）", hash_stats["misses"], "counter"),
+            render_gauge("fg_hash_cache_hit_ratio", "字段哈希缓存命中率", hash_stats["hit_ratio"]),
+        ]
+    return gauges
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus 抓取接口（当前 worker 进程的指标）"""
+    return Response(content=render_metrics(_collect_gauges()), media_type=PROMETHEUS_CONTENT_TYPE)
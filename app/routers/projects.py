@@ -4,9 +4,11 @@ from fastapi.responses import JSONResponse
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from typing import List
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 from datetime import datetime
 from app.deps import get_db, get_current_user, get_current_admin
-from app.schemas.project import ProjectCreate, ProjectResponse, ProjectUpdate
+from app.schemas.project import ItemUsageResponse, ProjectCreate, ProjectResponse, ProjectUpdate
+from app.services.broadcast import publish_project_change
 from app.services.cache import invalidate_cache
 
 router = APIRouter(prefix="/api/projects", tags=["projects"])
@@ -53,6 +55,31 @@ async def get_project(
     }
 
 
+@router.get("/{project_id}/usage", response_model=List[ItemUsageResponse])
+async def get_project_usage(
+    project_id: str,
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """获取项目下各 item 的使用统计（按项目中的 item 顺序，从未使用的 item 计数为 0）"""
+    project = await db.projects.find_one({"_id": ObjectId(project_id)}, {"name": 1, "items.name": 1})
+    if not project:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="项目不存在"
+        )
+    
+    usage = {}
+    async for doc in db.flag_usage.find({"project": project["name"]}, {"_id": 0, "project": 0}):
+        usage[doc["key"]] = doc
+    
+    return [
+        usage.get(item["name"], {"key": item["name"]})
+        for item in project.get("items", [])
+        if item.get("name")
+    ]
+
+
 @router.post("")
 async def create_project(
     request: Request,
@@ -76,9 +103,19 @@ async def create_project(
         "items": []
     }
     
-    result = await db.projects.insert_one(project)
+    try:
+        result = await db.projects.insert_one(project)
+    except DuplicateKeyError:
+        # 并发创建同名项目，由唯一索引拦截
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="项目名称已存在"
+        )
     project["_id"] = result.inserted_id
     
+    # 清除缓存（项目之前可能被记录为不存在）
+    invalidate_cache(project["name"])
+    
     return {
         "id": str(project["_id"]),
         "name": project["name"],
@@ -139,6 +176,19 @@ async def update_project(
             detail=f"存在重复的 Key（大小写不敏感）: {', '.join(duplicates)}"
         )
     
+    # 检查百分比灰度的取值（0-100）
+    invalid_rollouts = [
+        f"{item.name.strip()}: {condition.value}"
+        for item in project_data.items
+        for condition in [*item.conditions, *(c for g in item.condition_groups for c in g.conditions)]
+        if condition.operator == "rollout" and not _is_valid_percentage(condition.value)
+    ]
+    if invalid_rollouts:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"灰度百分比必须是 0-100 之间的数字: {', '.join(invalid_rollouts)}"
+        )
+    
     # 将 Pydantic 对象转换为字典
     items_dict = [item.model_dump() for item in project_data.items]
     
@@ -148,8 +198,9 @@ async def update_project(
         {"$set": {"items": items_dict}}
     )
     
-    # 清除缓存
+    # 清除缓存并通知订阅者
     invalidate_cache(project["name"])
+    publish_project_change(project["name"])
     
     updated_project = await db.projects.find_one({"_id": ObjectId(project_id)})
     
@@ -162,6 +213,15 @@ async def update_project(
     }
 
 
+def _is_valid_percentage(value) -> bool:
+    if isinstance(value, (list, bool)):
+        return False
+    try:
+        return 0 <= float(value) <= 100
+    except ValueError:
+        return False
+
+
 @router.delete("/{project_id}")
 async def delete_project(
     project_id: str,
@@ -179,7 +239,8 @@ async def delete_project(
     # 删除项目（items 会一起删除）
     await db.projects.delete_one({"_id": ObjectId(project_id)})
     
-    # 清除缓存
+    # 清除缓存并通知订阅者
     invalidate_cache(project["name"])
+    publish_project_change(project["name"])
     
     return {"message": "项目已删除"}
@@ -1,33 +1,46 @@
 """快照路由"""
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from typing import List
+from typing import List, Optional
 from bson import ObjectId
+from bson.errors import InvalidId
 from datetime import datetime
+import asyncio
+import base64
 import yaml
 from app.deps import get_db, get_current_user
 from app.schemas.snapshot import SnapshotCreate, SnapshotResponse
+from app.services.broadcast import publish_project_change
 from app.services.cache import invalidate_cache
+from app.services.snapshot_store import encode_snapshot, load_snapshot_yaml, SnapshotDataError
 
 router = APIRouter(prefix="/api/snapshots", tags=["snapshots"])
 
+# 优先使用 libyaml 的 C 实现（PyYAML 未编译 libyaml 时回退到纯 Python 实现）
+try:
+    from yaml import CSafeDumper as SnapshotDumper
+except ImportError:
+    from yaml import SafeDumper as SnapshotDumper
 
-async def generate_snapshot_yaml(db: AsyncIOMotorDatabase, project_id: str, remark: str = "", updated_by: str = "") -> str:
-    """生成项目快照的 YAML"""
-    # 获取项目信息
-    project = await db.projects.find_one({"_id": ObjectId(project_id)})
-    if not project:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="项目不存在"
-        )
-    
-    # 构建 YAML 数据（items 已经在 project 中）
-    snapshot_data = {
+# 估算大小超过该值（字节）的项目在线程池中生成 YAML
+THREAD_DUMP_MIN_SIZE = 64 * 1024
+
+
+def build_snapshot_header(remark: str = "", updated_by: str = "") -> str:
+    """生成快照 YAML 的元数据部分（每次保存都不同，不参与存储去重）"""
+    header_data = {
         "snapshot": {
             "updated_by": updated_by,
             "remark": remark
-        },
+        }
+    }
+    return yaml.dump(header_data, Dumper=SnapshotDumper, allow_unicode=True, sort_keys=False)
+
+
+def build_snapshot_content(project: dict) -> str:
+    """生成快照 YAML 的内容部分：项目信息与 items（同步，CPU 密集）"""
+    # 构建 YAML 数据（items 已经在 project 中）
+    content_data = {
         "project": {
             "id": str(project["_id"]),
             "name": project["name"],
@@ -35,48 +48,150 @@ async def generate_snapshot_yaml(db: AsyncIOMotorDatabase, project_id: str, rema
         },
         "items": project.get("items", [])
     }
+    return yaml.dump(content_data, Dumper=SnapshotDumper, allow_unicode=True, sort_keys=False)
+
+
+def build_snapshot_yaml(project: dict, remark: str = "", updated_by: str = "") -> str:
+    """生成项目快照的完整 YAML（顶层映射逐段输出，拼接结果与整体 dump 一致）"""
+    return build_snapshot_header(remark, updated_by) + build_snapshot_content(project)
+
+
+def _estimate_items_size(items: list) -> int:
+    """粗略估算 items 序列化后的大小（主要是白名单等条件值）"""
+    size = 0
+    for item in items:
+        size += 256
+        for group in item.get("condition_groups") or []:
+            for condition in group.get("conditions") or []:
+                size += 64 + len(str(condition.get("value", "")))
+        for condition in item.get("conditions") or []:
+            size += 64 + len(str(condition.get("value", "")))
+    return size
+
+
+async def generate_snapshot_content(project: dict) -> str:
+    """生成快照内容的 YAML，大项目在线程池中序列化，避免阻塞事件循环"""
+    if _estimate_items_size(project.get("items", [])) >= THREAD_DUMP_MIN_SIZE:
+        return await asyncio.to_thread(build_snapshot_content, project)
+    return build_snapshot_content(project)
+
+
+# 快照列表每页默认 / 最大条数
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# 列表接口默认不返回的大字段（旧版明文 yaml 与压缩后的 data）
+LIST_PROJECTION = {"yaml": 0, "data": 0}
+
+
+def _encode_cursor(snapshot: dict) -> str:
+    """生成分页游标（最后一条的 updated_at 和 _id）"""
+    raw = f"{snapshot['updated_at'].isoformat()}|{snapshot['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _cursor_filter(cursor: str) -> dict:
+    """解析分页游标为查询条件：排在游标之后（更早）的快照"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        updated_at_str, snapshot_id = raw.split("|")
+        updated_at = datetime.fromisoformat(updated_at_str)
+        object_id = ObjectId(snapshot_id)
+    except (ValueError, InvalidId):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="无效的分页游标"
+        )
+    return {"$or": [
+        {"updated_at": {"$lt": updated_at}},
+        {"updated_at": updated_at, "_id": {"$lt": object_id}},
+    ]}
+
+
+def _snapshot_to_dict(snapshot: dict, yaml_content: Optional[str] = None) -> dict:
+    """快照文档转换为响应数据（yaml_content 为还原后的 YAML，列表接口默认不返回）"""
+    data = {
+        "id": str(snapshot["_id"]),
+        "project_id": snapshot["project_id"],
+        "project_name": snapshot.get("project_name"),
+        "updated_by": snapshot["updated_by"],
+        "updated_at": snapshot["updated_at"],
+        "remark": snapshot.get("remark", "")
+    }
+    if yaml_content is not None:
+        data["yaml"] = yaml_content
+    return data
+
+
+async def _load_yaml(db: AsyncIOMotorDatabase, snapshot: dict) -> str:
+    """还原快照 YAML，数据损坏时返回 500"""
+    try:
+        header = build_snapshot_header(snapshot.get("remark", ""), snapshot["updated_by"])
+        return await load_snapshot_yaml(db, snapshot, header)
+    except SnapshotDataError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"快照数据无法还原: {e}"
+        )
+
+
+async def _list_snapshots(
+    db: AsyncIOMotorDatabase,
+    response: Response,
+    query: dict,
+    limit: int,
+    cursor: Optional[str],
+    include_yaml: bool
+) -> List[dict]:
+    """
+    按 (updated_at, _id) 倒序分页查询快照（keyset 分页）
     
-    return yaml.dump(snapshot_data, allow_unicode=True, sort_keys=False)
+    还有下一页时，在响应头 X-Next-Cursor 中返回下一页的游标
+    """
+    if cursor:
+        query = {"$and": [query, _cursor_filter(cursor)]}
+    projection = None if include_yaml else LIST_PROJECTION
+    
+    snapshots = await (
+        db.snapshots.find(query, projection)
+        .sort([("updated_at", -1), ("_id", -1)])
+        .limit(limit + 1)
+        .to_list(limit + 1)
+    )
+    if len(snapshots) > limit:
+        snapshots = snapshots[:limit]
+        response.headers["X-Next-Cursor"] = _encode_cursor(snapshots[-1])
+    
+    if not include_yaml:
+        return [_snapshot_to_dict(snapshot) for snapshot in snapshots]
+    return [_snapshot_to_dict(snapshot, await _load_yaml(db, snapshot)) for snapshot in snapshots]
 
 
-@router.get("/all")
+@router.get("/all", response_model=List[SnapshotResponse], response_model_exclude_none=True)
 async def get_all_snapshots(
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    include_yaml: bool = False,
     db: AsyncIOMotorDatabase = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    """获取所有快照（用于管理员页面）"""
-    snapshots = []
-    async for snapshot in db.snapshots.find().sort("updated_at", -1):
-        snapshots.append({
-            "id": str(snapshot["_id"]),
-            "project_id": snapshot["project_id"],
-            "project_name": snapshot.get("project_name"),
-            "yaml": snapshot["yaml"],
-            "updated_by": snapshot["updated_by"],
-            "updated_at": snapshot["updated_at"],
-            "remark": snapshot.get("remark", "")
-        })
-    return snapshots
-
-
-@router.get("", response_model=List[SnapshotResponse])
+    """获取所有快照（用于管理员页面，分页，默认不包含 YAML）"""
+    return await _list_snapshots(db, response, {}, limit, cursor, include_yaml)
+
+
+@router.get("", response_model=List[SnapshotResponse], response_model_exclude_none=True)
 async def get_snapshots(
     project_id: str,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    include_yaml: bool = False,
     db: AsyncIOMotorDatabase = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    """获取项目的历史快照"""
-    snapshots = []
-    async for snapshot in db.snapshots.find({"project_id": project_id}).sort("updated_at", -1):
-        snapshots.append({
-            "id": str(snapshot["_id"]),
-            "project_id": snapshot["project_id"],
-            "yaml": snapshot["yaml"],
-            "updated_by": snapshot["updated_by"],
-            "updated_at": snapshot["updated_at"],
-            "remark": snapshot.get("remark", "")
-        })
-    return snapshots
+    """获取项目的历史快照（分页，默认不包含 YAML）"""
+    return await _list_snapshots(db, response, {"project_id": project_id}, limit, cursor, include_yaml)
 
 
 @router.get("/{snapshot_id}", response_model=SnapshotResponse)
@@ -93,14 +208,7 @@ async def get_snapshot(
             detail="快照不存在"
         )
     
-    return {
-        "id": str(snapshot["_id"]),
-        "project_id": snapshot["project_id"],
-        "yaml": snapshot["yaml"],
-        "updated_by": snapshot["updated_by"],
-        "updated_at": snapshot["updated_at"],
-        "remark": snapshot.get("remark", "")
-    }
+    return _snapshot_to_dict(snapshot, await _load_yaml(db, snapshot))
 
 
 @router.post("", response_model=SnapshotResponse)
@@ -110,15 +218,7 @@ async def create_snapshot(
     current_user: dict = Depends(get_current_user)
 ):
     """创建快照"""
-    # 生成 YAML（包含备注和操作者）
-    yaml_content = await generate_snapshot_yaml(
-        db, 
-        snapshot_data.project_id,
-        remark=snapshot_data.remark,
-        updated_by=current_user["username"]
-    )
-    
-    # 获取项目信息
+    # 获取项目信息（只查询一次，YAML 直接由该文档生成）
     project = await db.projects.find_one({"_id": ObjectId(snapshot_data.project_id)})
     if not project:
         raise HTTPException(
@@ -126,29 +226,26 @@ async def create_snapshot(
             detail="项目不存在"
         )
     
+    # 生成 YAML：快照内容单独存储和去重，备注和操作者只作为快照字段保存
+    content = await generate_snapshot_content(project)
+    yaml_content = build_snapshot_header(snapshot_data.remark, current_user["username"]) + content
+    
     snapshot = {
         "project_id": snapshot_data.project_id,
         "project_name": project["name"],  # 冗余保存项目名称
-        "yaml": yaml_content,
         "updated_by": current_user["username"],
         "updated_at": datetime.utcnow(),
-        "remark": snapshot_data.remark
+        "remark": snapshot_data.remark,
+        # 压缩 / 差异 / 引用编码后的内容
+        **(await encode_snapshot(db, snapshot_data.project_id, content))
     }
     
     result = await db.snapshots.insert_one(snapshot)
     snapshot["_id"] = result.inserted_id
     
-    # 清除缓存
-    if project:
-        invalidate_cache(project["name"])
+    # 清除缓存并通知订阅者
+    invalidate_cache(project["name"])
+    publish_project_change(project["name"])
     
-    return {
-        "id": str(snapshot["_id"]),
-        "project_id": snapshot["project_id"],
-        "project_name": snapshot.get("project_name"),  # 包含项目名称
-        "yaml": snapshot["yaml"],
-        "updated_by": snapshot["updated_by"],
-        "updated_at": snapshot["updated_at"],
-        "remark": snapshot["remark"]
-    }
+    return _snapshot_to_dict(snapshot, yaml_content)
 
@@ -5,10 +5,15 @@ from datetime import datetime
 
 
 class Condition(BaseModel):
-    """条件"""
+    """
+    条件
+
+    operator 为 rollout 时是百分比灰度：value 为百分比（0-100，最多两位小数），
+    命中 hash(field) % 10000 < value × 100，不需要 comparator / target
+    """
     field: str
     operator: str
-    value: Union[int, str, List[str]]  # 支持数字、字符串、字符串数组
+    value: Union[int, float, str, List[str]]  # 支持数字、字符串、字符串数组
     comparator: Optional[str] = None  # 对于白名单操作符，comparator 可选
     target: Optional[Union[int, str]] = None  # 对于白名单操作符，target 可选
 
@@ -49,3 +54,15 @@ class ProjectResponse(BaseModel):
     
     class Config:
         from_attributes = True
+
+
+class ItemUsageResponse(BaseModel):
+    """功能项使用统计（各 worker 每隔 USAGE_FLUSH_INTERVAL_SECONDS 秒写入一次）"""
+    key: str
+    total: int = 0
+    true: int = 0  # 计算结果为 true 的次数
+    false: int = 0  # 计算结果为 false 的次数
+    off: int = 0  # item 关闭时的请求次数
+    value: int = 0  # /api/fg/get 读取次数
+    first_evaluated_at: Optional[datetime] = None
+    last_evaluated_at: Optional[datetime] = None
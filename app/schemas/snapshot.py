@@ -14,7 +14,8 @@ class SnapshotResponse(BaseModel):
     """快照响应"""
     id: str
     project_id: str
-    yaml: str
+    project_name: Optional[str] = None
+    yaml: Optional[str] = None  # 列表接口默认不返回，通过 /api/snapshots/{id} 获取
     updated_by: str
     updated_at: datetime
     remark: str
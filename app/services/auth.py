@@ -1,8 +1,12 @@
 """认证服务"""
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, UTC
-from typing import Optional
+from typing import Dict, Optional
+import asyncio
 import hashlib
+import time
 import bcrypt
+from cachetools import LRUCache
 from jose import JWTError, jwt
 from app.config import get_settings
 
@@ -22,6 +26,82 @@ def get_password_hash(password: str) -> str:
     return bcrypt.hashpw(preprocessed.encode(), salt).decode()
 
 
+# bcrypt 专用线程池：每次计算约 200ms，放在事件循环中会阻塞同一 worker 上的所有请求（包括 /api/fg/check）
+# 线程数即并发上限，超出的请求在协程中排队等待，不占用线程、不阻塞事件循环
+_password_executor = ThreadPoolExecutor(
+    max_workers=settings.password_hash_workers,
+    thread_name_prefix="bcrypt"
+)
+# 并发上限（按事件循环创建，测试等场景下可能存在多个事件循环）
+_password_semaphores: Dict[asyncio.AbstractEventLoop, asyncio.Semaphore] = {}
+
+
+class PasswordHashStats:
+    """bcrypt 线程池的排队情况"""
+    __slots__ = ("waiting", "running", "max_waiting", "completed", "wait_seconds", "run_seconds")
+
+    def __init__(self):
+        self.waiting = 0  # 当前排队数
+        self.running = 0  # 当前执行数
+        self.max_waiting = 0  # 最大排队数
+        self.completed = 0  # 累计完成次数
+        self.wait_seconds = 0.0  # 累计排队时间
+        self.run_seconds = 0.0  # 累计执行时间
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+password_hash_stats = PasswordHashStats()
+
+
+def _get_password_semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    semaphore = _password_semaphores.get(loop)
+    if semaphore is None:
+        # 清理已关闭的事件循环
+        for closed_loop in [l for l in _password_semaphores if l.is_closed()]:
+            del _password_semaphores[closed_loop]
+        semaphore = _password_semaphores[loop] = asyncio.Semaphore(settings.password_hash_workers)
+    return semaphore
+
+
+async def _run_password_hash(func, *args):
+    """在 bcrypt 线程池中执行，超出并发上限时排队"""
+    stats = password_hash_stats
+    queued_at = time.perf_counter()
+    stats.waiting += 1
+    stats.max_waiting = max(stats.max_waiting, stats.waiting)
+    waiting = True
+    try:
+        async with _get_password_semaphore():
+            stats.waiting -= 1
+            waiting = False
+            started_at = time.perf_counter()
+            stats.wait_seconds += started_at - queued_at
+            stats.running += 1
+            try:
+                return await asyncio.get_running_loop().run_in_executor(_password_executor, func, *args)
+            finally:
+                stats.running -= 1
+                stats.completed += 1
+                stats.run_seconds += time.perf_counter() - started_at
+    finally:
+        if waiting:
+            # 排队期间被取消
+            stats.waiting -= 1
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """验证密码（在 bcrypt 线程池中执行，不阻塞事件循环）"""
+    return await _run_password_hash(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """获取密码哈希（在 bcrypt 线程池中执行，不阻塞事件循环）"""
+    return await _run_password_hash(get_password_hash, password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """创建 JWT access token"""
     to_encode = data.copy()
@@ -34,11 +114,28 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
+# 已验证的 token：sha256(token) -> (payload, exp)
+# 同一个 cookie 的后续请求只需计算一次 sha256 并查表，跳过 JWT 解析与 HMAC 校验；
+# 只缓存校验通过的 token，过期后移除并按原流程校验（此时会失败）
+_verified_tokens: LRUCache = LRUCache(maxsize=settings.jwt_cache_maxsize)
+
+
 def decode_access_token(token: str) -> Optional[dict]:
-    """解码 JWT token"""
+    """解码 JWT token（返回的 payload 会被后续请求共享，调用方不要修改）"""
+    digest = hashlib.sha256(token.encode()).digest()
+    cached = _verified_tokens.get(digest)
+    if cached is not None:
+        payload, expires_at = cached
+        if expires_at is None or time.time() < expires_at:
+            return payload
+        _verified_tokens.pop(digest, None)
+    
     try:
         payload = jwt.decode(token, settings.jwt_secret_key, algorithms=[settings.jwt_algorithm])
-        return payload
     except JWTError:
         return None
+    
+    exp = payload.get("exp")
+    _verified_tokens[digest] = (payload, exp if isinstance(exp, (int, float)) else None)
+    return payload
 
@@ -0,0 +1,73 @@
+"""项目配置变更广播
+
+为 /api/fg/stream（SSE）提供进程内的共享广播：每个项目一个频道，
+频道中只有一个 asyncio.Event，所有订阅者等待同一个 Event。
+配置变更时把 Event 整体换新并 set 旧的，所有订阅者同时被唤醒，
+随后通过缓存（single-flight）读取新配置，数据库最多查询一次。
+
+空闲订阅者不占用任何轮询，数千个连接只是数千个挂起的协程。
+"""
+import asyncio
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+from app.services.compiler import CompiledProject
+
+
+class ProjectChannel:
+    """单个项目的广播频道"""
+    __slots__ = ("event", "subscribers", "_frame_version", "_frame")
+
+    def __init__(self):
+        self.event = asyncio.Event()
+        self.subscribers = 0
+        self._frame_version: Optional[str] = None
+        self._frame = b""
+
+    def notify(self):
+        """唤醒当前所有等待者（之后的等待者等待新的 Event）"""
+        event, self.event = self.event, asyncio.Event()
+        event.set()
+
+    def frame(self, project: CompiledProject) -> bytes:
+        """配置对应的 SSE 事件（同一版本只拼接一次，所有订阅者共享）"""
+        if self._frame_version != project.version:
+            self._frame = b"event: config\nid: %s\ndata: %s\n\n" % (project.version.encode(), project.config)
+            self._frame_version = project.version
+        return self._frame
+
+
+# 项目名称 -> 频道（只为有订阅者的项目创建）
+_channels: Dict[str, ProjectChannel] = {}
+
+
+@contextmanager
+def subscribe(project_name: str) -> Iterator[ProjectChannel]:
+    """订阅项目频道，退出时最后一个订阅者移除频道"""
+    channel = _channels.get(project_name)
+    if channel is None:
+        channel = _channels[project_name] = ProjectChannel()
+    channel.subscribers += 1
+    try:
+        yield channel
+    finally:
+        channel.subscribers -= 1
+        if channel.subscribers == 0 and _channels.get(project_name) is channel:
+            del _channels[project_name]
+
+
+def publish_project_change(project_name: str):
+    """通知项目配置已变更（应在缓存失效之后调用）"""
+    channel = _channels.get(project_name)
+    if channel is not None:
+        channel.notify()
+
+
+def publish_all_changes():
+    """通知所有频道（无法确定变更的项目时，例如全部缓存被清空）"""
+    for channel in list(_channels.values()):
+        channel.notify()
+
+
+def subscriber_count() -> int:
+    """当前进程的订阅者总数"""
+    return sum(channel.subscribers for channel in _channels.values())
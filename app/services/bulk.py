@@ -0,0 +1,204 @@
+"""批量计算引擎（NumPy 向量化）
+
+用于离线任务（人群预计算、邮件投放等）：对一个项目的全部 items，
+一次性计算一整列 ID（通常是 user_id）的命中结果。
+
+- 哈希：与 hash.hash_field 相同，md5 取前 8 字节（大端）转为 uint64，批量拼接后一次转换
+- 运算符及比较符：NumPy 数组运算；% 和 // 在除数为正整数时直接在 uint64 上计算，
+  其余情况（/、* 可能超出 uint64 精度）转为 Python 整数的 object 数组计算，结果与单次计算一致
+- in / not in：向量化集合成员判断（np.isin）
+- rollout：分桶（hash % 10000）与预先换算的上界比较
+
+需要安装 numpy：uv pip install -e ".[bulk]"
+"""
+import hashlib
+from typing import List, Dict, Any, Iterable, Iterator, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError as e:  # pragma: no cover
+    raise ImportError('批量计算需要 numpy，请安装：uv pip install -e ".[bulk]"') from e
+
+from app.services.evaluator import ROLLOUT_BUCKETS, _parse_list_value, rollout_bucket_end
+
+# 哈希运算符对应的数组运算
+_VECTOR_OPERATORS = {
+    "%": np.remainder,
+    "/": np.true_divide,
+    "//": np.floor_divide,
+    "*": np.multiply,
+}
+
+# 可以直接在 uint64 上计算的运算符（除数为正整数时与 Python 整数结果一致）
+_UINT64_OPERATORS = ("%", "//")
+
+# 比较符对应的数组运算
+_VECTOR_COMPARATORS = {
+    ">": np.greater,
+    "<": np.less,
+    ">=": np.greater_equal,
+    "<=": np.less_equal,
+    "==": np.equal,
+    "!=": np.not_equal,
+}
+
+
+def hash_column(values: Sequence[str]) -> "np.ndarray":
+    """批量哈希，返回 uint64 数组（与 hash_field 结果一致）"""
+    md5 = hashlib.md5
+    digests = b"".join(md5(v.encode()).digest()[:8] for v in values)
+    return np.frombuffer(digests, dtype=">u8").astype(np.uint64)
+
+
+class _Column:
+    """一列 ID 及其按需计算的哈希值"""
+
+    def __init__(self, field: str, ids: Sequence[str]):
+        self.field = field
+        self.ids = np.asarray(ids, dtype=str)
+        # 空字符串视为上下文中没有该字段
+        self.present = self.ids != ""
+        self._hashed = None
+
+    @property
+    def hashed(self) -> "np.ndarray":
+        if self._hashed is None:
+            self._hashed = hash_column(self.ids.tolist())
+        return self._hashed
+
+
+def _apply_operator(operator: str, hashed: "np.ndarray", value) -> "np.ndarray":
+    """对哈希列应用运算符"""
+    vector_op = _VECTOR_OPERATORS.get(operator)
+    if vector_op is None:
+        # 未知运算符，直接使用哈希值
+        return hashed
+
+    if operator in ("/", "//") and value == 0:
+        return np.zeros(len(hashed), dtype=np.uint64)
+
+    if operator in _UINT64_OPERATORS and isinstance(value, int) and not isinstance(value, bool) and value > 0:
+        return vector_op(hashed, np.uint64(value))
+
+    # 其余情况按 Python 整数计算（object 数组），保证与单次计算一致
+    return vector_op(hashed.astype(object), value)
+
+
+def _evaluate_condition(condition: Dict[str, Any], column: _Column) -> "np.ndarray":
+    """计算单个条件，返回布尔数组"""
+    n = len(column.ids)
+    if condition.get("field") != column.field:
+        # 上下文中没有该字段
+        return np.zeros(n, dtype=bool)
+
+    operator = condition.get("operator")
+    value = condition.get("value")
+
+    if operator == "==":
+        return column.present & (column.ids == str(value))
+    if operator == "!=":
+        return column.present & (column.ids != str(value))
+    if operator in ("in", "not in"):
+        members = np.array(_parse_list_value(value), dtype=str)
+        matched = np.isin(column.ids, members)
+        if operator == "not in":
+            matched = ~matched
+        return column.present & matched
+    if operator == "rollout":
+        buckets = np.remainder(column.hashed, np.uint64(ROLLOUT_BUCKETS))
+        return column.present & (buckets < rollout_bucket_end(value))
+
+    comparator = _VECTOR_COMPARATORS.get(condition.get("comparator"))
+    if comparator is None:
+        return np.zeros(n, dtype=bool)
+
+    result = _apply_operator(operator, column.hashed, value)
+    matched = comparator(result, condition.get("target")).astype(bool)
+    return column.present & matched
+
+
+def _evaluate_group(conditions: List[Dict[str, Any]], logic: str, column: _Column) -> "np.ndarray":
+    """计算条件组（组内 AND / OR）"""
+    n = len(column.ids)
+    if not conditions:
+        return np.ones(n, dtype=bool)
+    results = [_evaluate_condition(c, column) for c in conditions]
+    if logic == "or":
+        return np.logical_or.reduce(results)
+    return np.logical_and.reduce(results)
+
+
+def evaluate_item_column(item: Dict[str, Any], column: _Column) -> "np.ndarray":
+    """计算单个 item 对一列 ID 的结果，语义与 compiler.compile_item 一致"""
+    n = len(column.ids)
+    if not item.get("enabled", True):
+        return np.zeros(n, dtype=bool)
+
+    condition_groups = item.get("condition_groups") or []
+    conditions = item.get("conditions") or []
+
+    if condition_groups:
+        results = [
+            _evaluate_group(g.get("conditions", []), g.get("logic", "and"), column)
+            for g in condition_groups
+        ]
+        return np.logical_or.reduce(results)
+    if conditions:
+        return _evaluate_group(conditions, "and", column)
+    return np.ones(n, dtype=bool)
+
+
+def evaluate_bulk(
+    items: List[Dict[str, Any]],
+    ids: Sequence[str],
+    field: str = "user_id"
+) -> Tuple[List[str], "np.ndarray"]:
+    """
+    批量计算
+
+    Args:
+        items: 项目的 items（数据库中的 dict 格式）
+        ids: 一列字段值
+        field: 字段名，默认 user_id（其余字段视为不存在）
+
+    Returns:
+        (item 名称列表, 形状为 (len(ids), len(items)) 的布尔矩阵)
+    """
+    items = [item for item in items if item.get("name")]
+    column = _Column(field, ids)
+    names = [item["name"] for item in items]
+    if not items:
+        return names, np.zeros((len(column.ids), 0), dtype=bool)
+    matrix = np.column_stack([evaluate_item_column(item, column) for item in items])
+    return names, matrix
+
+
+def iter_bulk(
+    items: List[Dict[str, Any]],
+    ids: Iterable[str],
+    field: str = "user_id",
+    chunk_size: int = 100_000
+) -> Iterator[Tuple[str, Dict[str, bool]]]:
+    """分块批量计算，逐个产出 (id, {item 名称: 是否命中})，内存占用与 chunk_size 成正比"""
+    for names, chunk, matrix in iter_bulk_chunks(items, ids, field, chunk_size):
+        for i, value in enumerate(chunk):
+            yield value, dict(zip(names, matrix[i].tolist()))
+
+
+def iter_bulk_chunks(
+    items: List[Dict[str, Any]],
+    ids: Iterable[str],
+    field: str = "user_id",
+    chunk_size: int = 100_000
+) -> Iterator[Tuple[List[str], List[str], "np.ndarray"]]:
+    """分块批量计算，逐块产出 (item 名称列表, 本块 ids, 布尔矩阵)"""
+    chunk: List[str] = []
+    for value in ids:
+        chunk.append(value)
+        if len(chunk) >= chunk_size:
+            names, matrix = evaluate_bulk(items, chunk, field)
+            yield names, chunk, matrix
+            chunk = []
+    if chunk:
+        names, matrix = evaluate_bulk(items, chunk, field)
+        yield names, chunk, matrix
@@ -1,41 +1,233 @@
 """内存缓存管理"""
+import asyncio
+import random
+import time
 from cachetools import TTLCache
-from typing import Optional, Dict, Any
+from typing import Awaitable, Callable, Dict, Optional
 from app.config import get_settings
+from app.services.compiler import CompiledItem, CompiledProject
+from app.services.metrics import cache_evictions, cache_requests
 
 settings = get_settings()
 
+# 软过期时间（秒）：超过后在后台刷新（stale-while-revalidate），刷新完成前继续返回旧快照
+SOFT_TTL = settings.cache_ttl_seconds
+# 硬过期时间（秒）：超过后条目被移除，下次请求同步查询数据库
+HARD_TTL = (
+    max(settings.cache_hard_ttl_seconds, SOFT_TTL)
+    if settings.cache_stale_while_revalidate
+    else SOFT_TTL
+)
+
+
+class CacheEntry:
+    """缓存条目：项目快照及其软过期时间"""
+    __slots__ = ("project", "refresh_at")
+
+    def __init__(self, project: CompiledProject, refresh_at: float):
+        self.project = project
+        self.refresh_at = refresh_at
+
+
+def _next_refresh_at() -> float:
+    """计算下一次后台刷新的时间（带随机抖动，分散同时创建的条目）"""
+    if not settings.cache_stale_while_revalidate:
+        return float("inf")
+    return time.monotonic() + SOFT_TTL * (1 - settings.cache_ttl_jitter * random.random())
+
+
+class MeteredTTLCache(TTLCache):
+    """记录淘汰次数的 TTLCache（容量淘汰与过期移除，主动清空不计入）"""
+
+    _clearing = False
+
+    def popitem(self):
+        item = super().popitem()
+        if not self._clearing:
+            cache_evictions.inc(("capacity",))
+        return item
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        if expired and not self._clearing:
+            cache_evictions.inc(("expired",), len(expired))
+        return expired
+
+    def clear(self):
+        # 旧版本 cachetools 的 clear 通过 popitem 逐个移除
+        self._clearing = True
+        try:
+            super().clear()
+        finally:
+            self._clearing = False
+
+
 # 创建 TTL 缓存
-# maxsize: 最多缓存 1000 个项目
-# ttl: 缓存过期时间（秒）
-item_cache = TTLCache(maxsize=1000, ttl=settings.cache_ttl_seconds)
+# 每个项目一个条目，值为 CacheEntry，其中的项目快照（CompiledProject）不可变
+# 更新时整体替换，读请求拿到的始终是完整一致的快照
+# maxsize: 最多缓存的项目数
+# ttl: 硬过期时间（秒）
+project_cache = MeteredTTLCache(maxsize=settings.cache_maxsize, ttl=HARD_TTL)
+
+# 负缓存：记录不存在的项目，避免未知项目的请求每次都查询数据库
+missing_project_cache = TTLCache(maxsize=settings.cache_maxsize, ttl=settings.cache_negative_ttl_seconds)
+
+# 正在加载中的项目（single-flight）：同一项目同时只有一个协程查询数据库
+# 失效时移除对应的登记，加载结束时发现自己已不在登记中，说明期间发生过失效，
+# 加载结果可能是旧数据，不再写入缓存（只在加载期间占用条目，不随项目名称增长）
+_inflight_loads: Dict[str, "asyncio.Task[Optional[CompiledProject]]"] = {}
+
+# 项目 ID -> 项目名称（删除事件只带 ID，用于按 ID 失效）
+# 只记录写入过缓存的项目，容量与过期时间同项目缓存
+_project_names_by_id = TTLCache(maxsize=settings.cache_maxsize, ttl=HARD_TTL)
+
+ProjectLoader = Callable[[str], Awaitable[Optional[CompiledProject]]]
+
 
+def get_cached_project(project_name: str) -> Optional[CompiledProject]:
+    """从缓存获取项目快照（不触发刷新）"""
+    entry = project_cache.get(project_name)
+    return entry.project if entry is not None else None
 
-def get_cache_key(project_name: str, item_name: str) -> str:
-    """生成缓存键"""
-    return f"{project_name}:{item_name}"
 
+def set_cached_project(project_name: str, project: CompiledProject):
+    """设置项目快照到缓存（整体替换）"""
+    project_cache[project_name] = CacheEntry(project, _next_refresh_at())
+    missing_project_cache.pop(project_name, None)
+    if project.id:
+        _project_names_by_id[project.id] = project_name
 
-def get_cached_item(project_name: str, item_name: str) -> Optional[Dict[str, Any]]:
-    """从缓存获取 item"""
-    key = get_cache_key(project_name, item_name)
-    return item_cache.get(key)
 
+def replace_cached_project(project_name: str, project: CompiledProject):
+    """
+    推送新的项目快照（来自变更监听）
+    
+    只替换本进程已缓存的项目，未缓存的项目仅清除负缓存，等到有请求时再加载
+    """
+    cached = project_name in project_cache
+    invalidate_cache(project_name)
+    if cached:
+        set_cached_project(project_name, project)
 
-def set_cached_item(project_name: str, item_name: str, item_data: Dict[str, Any]):
-    """设置 item 到缓存"""
-    key = get_cache_key(project_name, item_name)
-    item_cache[key] = item_data
+
+def get_cached_item(project_name: str, item_name: str) -> Optional[CompiledItem]:
+    """从缓存的项目快照中获取 item（大小写不敏感）"""
+    project = get_cached_project(project_name)
+    if project is None:
+        return None
+    return project.get_item(item_name)
+
+
+async def get_or_load_project(project_name: str, loader: ProjectLoader) -> Optional[CompiledProject]:
+    """
+    获取项目快照，未命中时通过 loader 加载
+    
+    - 超过软过期时间的条目继续返回，同时在后台刷新（stale-while-revalidate）
+    - 不存在的项目会被短暂缓存（负缓存），期间直接返回 None
+    - 并发未命中时只有一个协程调用 loader，其余协程等待同一个结果
+    """
+    entry = project_cache.get(project_name)
+    if entry is not None:
+        if entry.refresh_at <= time.monotonic() and project_name not in _inflight_loads:
+            # 刷新失败时旧快照继续可用，到下一个软过期时间再重试
+            entry.refresh_at = _next_refresh_at()
+            _start_load(project_name, loader)
+            cache_requests.inc(("stale",))
+        else:
+            cache_requests.inc(("hit",))
+        return entry.project
+    
+    if project_name in missing_project_cache:
+        cache_requests.inc(("negative",))
+        return None
+    
+    task = _inflight_loads.get(project_name)
+    if task is None:
+        task = _start_load(project_name, loader)
+        cache_requests.inc(("miss",))
+    else:
+        cache_requests.inc(("coalesced",))
+    
+    # shield: 某个等待者被取消时不影响其他等待者共享的加载任务
+    return await asyncio.shield(task)
+
+
+def _start_load(project_name: str, loader: ProjectLoader) -> asyncio.Task:
+    """启动加载任务并登记为 in-flight"""
+    task = asyncio.ensure_future(_load_project(project_name, loader))
+    _inflight_loads[project_name] = task
+    task.add_done_callback(lambda t: _finish_load(project_name, t))
+    return task
+
+
+async def _load_project(project_name: str, loader: ProjectLoader) -> Optional[CompiledProject]:
+    """调用 loader 并写入缓存（正缓存或负缓存）"""
+    task = asyncio.current_task()
+    project = await loader(project_name)
+    if _inflight_loads.get(project_name) is not task:
+        # 加载期间缓存已失效，结果可能是旧数据，只返回给已在等待的请求
+        return project
+    if project is None:
+        project_cache.pop(project_name, None)
+        missing_project_cache[project_name] = True
+    else:
+        set_cached_project(project_name, project)
+    return project
+
+
+def _finish_load(project_name: str, task: asyncio.Task):
+    """加载结束后移除 in-flight 记录"""
+    if _inflight_loads.get(project_name) is task:
+        del _inflight_loads[project_name]
+    if not task.cancelled() and task.exception() is not None:
+        print(f"加载项目 '{project_name}' 失败: {task.exception()!r}")
 
 
 def invalidate_cache(project_name: str):
-    """清除指定项目的所有缓存"""
-    keys_to_delete = [key for key in item_cache.keys() if key.startswith(f"{project_name}:")]
-    for key in keys_to_delete:
-        del item_cache[key]
+    """
+    清除指定项目的缓存（包括负缓存），O(1)
+    
+    同时移除进行中的加载登记，该加载不会再把旧数据写回缓存，
+    之后的请求会发起新的加载
+    """
+    project_cache.pop(project_name, None)
+    missing_project_cache.pop(project_name, None)
+    _inflight_loads.pop(project_name, None)
+
+
+def invalidate_cache_by_id(project_id: str) -> Optional[str]:
+    """按项目 ID 清除缓存，返回项目名称（本进程未见过该项目时返回 None）"""
+    project_name = _project_names_by_id.pop(project_id, None)
+    if project_name is not None:
+        invalidate_cache(project_name)
+    return project_name
 
 
 def clear_all_cache():
     """清除所有缓存"""
-    item_cache.clear()
+    project_cache.clear()
+    missing_project_cache.clear()
+    _inflight_loads.clear()
+
+
+# 用户缓存：用户名 -> 用户文档
+# 认证依赖（get_current_user / get_optional_user）每个请求都要读取用户，
+# 缓存后管理页面的每次点击、htmx 局部刷新不再查询数据库；
+# 本进程的创建 / 删除用户、修改密码会立即失效，其他 worker 最多延迟 TTL
+# 缓存的文档由所有请求共享，调用方不要修改
+user_cache = TTLCache(maxsize=settings.user_cache_maxsize, ttl=settings.user_cache_ttl_seconds)
+
+
+def get_cached_user(username: str) -> Optional[dict]:
+    """从缓存获取用户文档"""
+    return user_cache.get(username)
+
+
+def set_cached_user(username: str, user: dict):
+    """缓存用户文档"""
+    user_cache[username] = user
+
 
+def invalidate_user_cache(username: str):
+    """清除指定用户的缓存"""
+    user_cache.pop(username, None)
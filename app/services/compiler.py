@@ -0,0 +1,331 @@
+"""条件预编译
+
+在 item 进入缓存时，将 conditions / condition_groups 编译为带 __slots__ 的谓词对象，
+运算符与比较符提前解析为函数，每次检查只需执行预编译好的谓词，
+不再重复读取 dict、遍历 if/elif 分支。语义与 evaluator 保持一致。
+
+谓词调用形式为 predicate(context, hashes)，hashes 是单次请求内的字段哈希缓存，
+同一请求内（包括批量计算多个 item 时）每个字段只哈希一次。
+
+编译项目时同时生成规范化配置（JSON）及其版本号，供 /api/fg/config 下发给客户端 SDK（fgclient）
+在本地计算；本模块不依赖数据库与应用配置，客户端可以直接复用。
+"""
+import hashlib
+import json
+import operator as _operator
+from types import MappingProxyType
+from typing import List, Dict, Any, Mapping, Optional, Tuple
+from app.services.evaluator import ROLLOUT_BUCKETS, _parse_list_value, rollout_bucket_end
+from app.services.fastjson import dumps as json_dumps
+from app.services.hash import get_hashed_value
+
+
+def _div(hashed: int, value):
+    return hashed / value if value != 0 else 0
+
+
+def _floordiv(hashed: int, value):
+    return hashed // value if value != 0 else 0
+
+
+def _identity(hashed: int, value):
+    # 未知运算符，直接使用哈希值
+    return hashed
+
+
+def _never(result, target) -> bool:
+    # 未知比较符，始终不满足
+    return False
+
+
+def _contains(field_value: str, values) -> bool:
+    return field_value in values
+
+
+def _not_contains(field_value: str, values) -> bool:
+    return field_value not in values
+
+
+# 哈希运算符
+HASH_OPERATORS = {
+    "%": _operator.mod,
+    "/": _div,
+    "//": _floordiv,
+    "*": _operator.mul,
+}
+
+# 比较符
+COMPARATORS = {
+    ">": _operator.gt,
+    "<": _operator.lt,
+    ">=": _operator.ge,
+    "<=": _operator.le,
+    "==": _operator.eq,
+    "!=": _operator.ne,
+}
+
+# 白名单操作符（直接比较字段值，不进行哈希）
+VALUE_OPERATORS = {
+    "==": _operator.eq,
+    "!=": _operator.ne,
+    "in": _contains,
+    "not in": _not_contains,
+}
+
+
+class ValueCondition:
+    """白名单类条件：==、!=、in、not in"""
+    __slots__ = ("field", "compare", "operand")
+
+    def __init__(self, field: str, compare, operand):
+        self.field = field
+        self.compare = compare
+        self.operand = operand
+
+    def __call__(self, context: Dict[str, str], hashes: Dict[str, int]) -> bool:
+        field_value = context.get(self.field)
+        if field_value is None:
+            return False
+        return self.compare(str(field_value), self.operand)
+
+
+class HashCondition:
+    """哈希运算类条件：hash(field) <operator> value <comparator> target"""
+    __slots__ = ("field", "operator", "value", "comparator", "target")
+
+    def __init__(self, field: str, operator, value, comparator, target):
+        self.field = field
+        self.operator = operator
+        self.value = value
+        self.comparator = comparator
+        self.target = target
+
+    def __call__(self, context: Dict[str, str], hashes: Dict[str, int]) -> bool:
+        field_value = context.get(self.field)
+        if field_value is None:
+            return False
+        hashed = hashes.get(self.field)
+        if hashed is None:
+            hashed = hashes[self.field] = get_hashed_value(self.field, field_value)
+        return self.comparator(self.operator(hashed, self.value), self.target)
+
+
+class RolloutCondition:
+    """百分比灰度：hash(field) % ROLLOUT_BUCKETS 落在 [0, end) 内，end 在编译时由百分比换算"""
+    __slots__ = ("field", "end")
+
+    def __init__(self, field: str, end: int):
+        self.field = field
+        self.end = end
+
+    def __call__(self, context: Dict[str, str], hashes: Dict[str, int]) -> bool:
+        field_value = context.get(self.field)
+        if field_value is None:
+            return False
+        hashed = hashes.get(self.field)
+        if hashed is None:
+            hashed = hashes[self.field] = get_hashed_value(self.field, field_value)
+        return hashed % ROLLOUT_BUCKETS < self.end
+
+
+class CompiledGroup:
+    """条件组：match_any 为 True 时组内 OR，否则组内 AND"""
+    __slots__ = ("conditions", "match_any")
+
+    def __init__(self, conditions: Tuple, match_any: bool):
+        self.conditions = conditions
+        self.match_any = match_any
+
+    def __call__(self, context: Dict[str, str], hashes: Dict[str, int]) -> bool:
+        if not self.conditions:
+            return True
+        if self.match_any:
+            for condition in self.conditions:
+                if condition(context, hashes):
+                    return True
+            return False
+        for condition in self.conditions:
+            if not condition(context, hashes):
+                return False
+        return True
+
+
+class CompiledItem:
+    """编译后的 item（value_json 为预先序列化的 value，供 /api/fg/get 直接拼接响应）"""
+    __slots__ = ("name", "enabled", "value", "value_json", "groups")
+
+    def __init__(self, name: str, enabled: bool, value: str, groups: Tuple[CompiledGroup, ...]):
+        self.name = name
+        self.enabled = enabled
+        self.value = value
+        self.value_json = json_dumps(value)
+        self.groups = groups
+
+    def evaluate(self, context: Dict[str, str], hashes: Optional[Dict[str, int]] = None) -> bool:
+        """
+        计算 item 是否对当前上下文生效（组间 OR）
+        
+        批量计算多个 item 时传入同一个 hashes，使每个字段只哈希一次
+        """
+        if not self.enabled:
+            return False
+        if not self.groups:
+            return True
+        if hashes is None:
+            hashes = {}
+        for group in self.groups:
+            if group(context, hashes):
+                return True
+        return False
+
+
+def normalize_key(key: str) -> str:
+    """规范化 item key（去除首尾空白，小写），建索引与查询使用同一规则"""
+    return key.strip().lower()
+
+
+class CompiledProject:
+    """
+    编译后的项目快照，缓存中保存的就是该对象
+
+    创建后不再修改，更新时整体替换；items 按规范化后的 key 索引。
+    config 为序列化好的规范化配置（JSON 字节串），version 为其内容哈希，
+    内容相同的配置在所有 worker 上版本号一致
+    """
+    __slots__ = ("id", "name", "items", "version", "config")
+
+    def __init__(
+        self,
+        id: str,
+        name: str,
+        items: Mapping[str, CompiledItem],
+        version: str = "",
+        config: bytes = b""
+    ):
+        self.id = id
+        self.name = name
+        self.items = items
+        self.version = version
+        self.config = config
+
+    def get_item(self, key: str) -> Optional[CompiledItem]:
+        """按 key 获取 item（大小写不敏感）"""
+        return self.items.get(normalize_key(key))
+
+
+def compile_condition(condition: Dict[str, Any]):
+    """编译单个条件"""
+    field = condition.get("field")
+    operator = condition.get("operator")
+    value = condition.get("value")
+
+    if operator == "rollout":
+        return RolloutCondition(field, rollout_bucket_end(value))
+
+    compare = VALUE_OPERATORS.get(operator)
+    if compare is not None:
+        if operator in ("in", "not in"):
+            # 白名单/黑名单预解析为 frozenset，检查时 O(1) 且不产生新对象
+            operand = frozenset(_parse_list_value(value))
+        else:
+            operand = str(value)
+        return ValueCondition(field, compare, operand)
+
+    return HashCondition(
+        field,
+        HASH_OPERATORS.get(operator, _identity),
+        value,
+        COMPARATORS.get(condition.get("comparator"), _never),
+        condition.get("target"),
+    )
+
+
+def compile_conditions(conditions: List[Dict[str, Any]], logic: str = "and") -> CompiledGroup:
+    """编译条件列表为条件组"""
+    return CompiledGroup(
+        tuple(compile_condition(c) for c in conditions),
+        logic == "or",
+    )
+
+
+def compile_item(item: Dict[str, Any]) -> CompiledItem:
+    """
+    编译 item
+
+    优先使用 condition_groups（组间 OR，组内按各组 logic），
+    否则回退到 conditions（AND 逻辑，向后兼容），都没有则直接返回 enabled。
+    """
+    condition_groups = item.get("condition_groups") or []
+    conditions = item.get("conditions") or []
+
+    groups: Tuple[CompiledGroup, ...]
+    if condition_groups:
+        groups = tuple(
+            compile_conditions(g.get("conditions", []), g.get("logic", "and"))
+            for g in condition_groups
+        )
+    elif conditions:
+        groups = (compile_conditions(conditions),)
+    else:
+        groups = ()
+
+    return CompiledItem(
+        name=item.get("name", ""),
+        enabled=item.get("enabled", True),
+        value=item.get("value", ""),
+        groups=groups,
+    )
+
+
+def normalize_condition(condition: Dict[str, Any]) -> Dict[str, Any]:
+    """规范化条件（只保留计算需要的字段）"""
+    return {
+        "field": condition.get("field"),
+        "operator": condition.get("operator"),
+        "value": condition.get("value"),
+        "comparator": condition.get("comparator"),
+        "target": condition.get("target"),
+    }
+
+
+def normalize_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """规范化 item（补齐默认值，去掉 description 等与计算无关的字段）"""
+    return {
+        "name": item.get("name", ""),
+        "enabled": item.get("enabled", True),
+        "value": item.get("value", ""),
+        "conditions": [normalize_condition(c) for c in item.get("conditions") or []],
+        "condition_groups": [
+            {
+                "logic": g.get("logic", "and"),
+                "conditions": [normalize_condition(c) for c in g.get("conditions") or []],
+            }
+            for g in item.get("condition_groups") or []
+        ],
+    }
+
+
+def compile_project(project_doc: Dict[str, Any]) -> CompiledProject:
+    """编译整个项目（一次查询即可服务项目下所有 key）"""
+    items = {}
+    normalized_items = []
+    for item in project_doc.get("items", []):
+        key = normalize_key(item.get("name", ""))
+        if not key or key in items:
+            continue
+        items[key] = compile_item(item)
+        normalized_items.append(normalize_item(item))
+
+    name = project_doc.get("name", "")
+    items_json = json.dumps(normalized_items, ensure_ascii=False, separators=(",", ":"), default=str)
+    version = hashlib.sha256(f"{name}\n{items_json}".encode()).hexdigest()[:16]
+    config = '{"project":%s,"version":"%s","items":%s}' % (
+        json.dumps(name, ensure_ascii=False), version, items_json
+    )
+    return CompiledProject(
+        str(project_doc.get("_id", "")),
+        name,
+        MappingProxyType(items),
+        version,
+        config.encode(),
+    )
@@ -1,4 +1,5 @@
 """条件表达式计算引擎"""
+from functools import lru_cache
 from typing import List, Dict, Any, Union
 from app.services.hash import get_hashed_value
 
@@ -23,6 +24,60 @@ def _parse_list_value(value: Union[str, list]) -> List[str]:
     return []
 
 
+def _list_contains(value: Union[str, list], target: str) -> bool:
+    """
+    判断 target 是否在列表值中（与 target in _parse_list_value(value) 结果一致）
+
+    直接在原值上线性查找，不构建列表或集合；编译后的条件使用预解析的 frozenset
+    """
+    if isinstance(value, list):
+        return any(str(v).strip() == target for v in value)
+    if not isinstance(value, str) or not target or target != target.strip():
+        return False
+
+    separator = '\n' if '\n' in value else ','
+    if separator in target:
+        return False
+    # 找到 target 出现的位置，且前后到分隔符之间只有空白，即为完整的一项
+    start = value.find(target)
+    while start != -1:
+        end = start + len(target)
+        item_start = value.rfind(separator, 0, start) + 1
+        item_end = value.find(separator, end)
+        if item_end == -1:
+            item_end = len(value)
+        if not value[item_start:start].strip() and not value[end:item_end].strip():
+            return True
+        start = value.find(target, start + 1)
+    return False
+
+
+# 百分比灰度（rollout）的分桶数：bucket = hash(field) % 10000，粒度 0.01%
+ROLLOUT_BUCKETS = 10000
+
+
+def rollout_bucket_end(percentage: Any) -> int:
+    """
+    灰度百分比 -> 允许的分桶上界（不含），命中范围为 [0, end)
+
+    分桶空间固定，调高百分比只会扩大范围，已命中的用户保持命中；
+    无法解析的值视为 0%（不命中），超出 0-100 的值截断
+    """
+    try:
+        percentage = float(percentage)
+    except (TypeError, ValueError):
+        return 0
+    if percentage != percentage:  # NaN
+        return 0
+    return max(0, min(ROLLOUT_BUCKETS, int(round(percentage * ROLLOUT_BUCKETS / 100))))
+
+
+@lru_cache(maxsize=256)
+def _rollout_bucket_end_cached(percentage: Union[int, float, str]) -> int:
+    """按百分比缓存换算结果（未编译的条件每次计算都会用到）"""
+    return rollout_bucket_end(percentage)
+
+
 def evaluate_condition(condition: Dict[str, Any], context: Dict[str, str]) -> bool:
     """
     计算单个条件是否满足
@@ -52,6 +107,14 @@ def evaluate_condition(condition: Dict[str, Any], context: Dict[str, str]) -> bo
         "operator": "in",
         "value": ["1", "2", "3"]  // 或 "1,2,3" 或 "1\n2\n3\n4"
     }
+    
+    4. 百分比灰度（rollout）：
+    {
+        "field": "user_id",
+        "operator": "rollout",
+        "value": 12.5  // 百分比 0-100
+    }
+    计算逻辑：hash(user_id) % 10000 < 1250
     """
     field = condition.get("field")
     operator = condition.get("operator")
@@ -75,17 +138,20 @@ def evaluate_condition(condition: Dict[str, Any], context: Dict[str, str]) -> bo
     
     elif operator == "in":
         # 白名单判断
-        whitelist = _parse_list_value(value)
-        return str(field_value) in whitelist
+        return _list_contains(value, str(field_value))
     
     elif operator == "not in":
         # 黑名单判断
-        blacklist = _parse_list_value(value)
-        return str(field_value) not in blacklist
+        return not _list_contains(value, str(field_value))
     
     # 哈希运算操作符：对字段进行哈希后计算
     hashed = get_hashed_value(field, field_value)
     
+    if operator == "rollout":
+        # 百分比灰度：分桶落在 [0, 百分比 × 100) 内
+        end = rollout_bucket_end(value) if isinstance(value, list) else _rollout_bucket_end_cached(value)
+        return hashed % ROLLOUT_BUCKETS < end
+    
     # 应用运算符
     if operator == "%":
         result = hashed % value
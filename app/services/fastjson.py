@@ -0,0 +1,23 @@
+"""JSON 快速序列化
+
+热点接口（/api/fg/check、/api/fg/get）直接返回序列化好的字节串，不经过 Pydantic 响应模型。
+orjson 可用时使用 orjson，否则回退到标准库 json；两者输出一致（紧凑分隔符、不转义非 ASCII 字符），
+与 FastAPI 默认的 JSONResponse 相同。
+"""
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+if orjson is not None:
+    def dumps(obj: Any) -> bytes:
+        """序列化为 JSON 字节串"""
+        return orjson.dumps(obj)
+else:  # pragma: no cover
+    def dumps(obj: Any) -> bytes:
+        """序列化为 JSON 字节串"""
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
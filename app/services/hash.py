@@ -1,5 +1,17 @@
-"""字段哈希处理"""
+"""字段哈希处理
+
+get_hashed_value 带一个进程内共享的 LRU 缓存：(字段, 值) -> 哈希值。
+线上流量集中在少量活跃用户上，同一个 user_id 在每个请求、每个 item 上反复出现，
+命中缓存时只是一次字典查找，不再计算 md5。
+
+缓存大小由应用启动时调用 configure_hash_cache 设置（HASH_CACHE_MAXSIZE），
+本模块不依赖应用配置，客户端 SDK（fgclient）与离线任务可以直接复用，默认大小为 DEFAULT_HASH_CACHE_SIZE。
+"""
 import hashlib
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+DEFAULT_HASH_CACHE_SIZE = 10000
 
 
 def hash_field(value: str) -> int:
@@ -33,11 +45,79 @@ FIELD_HASHERS = {
 }
 
 
-def get_hashed_value(field: str, value: str) -> int:
-    """根据字段名获取哈希值"""
+def _compute_hashed_value(field: str, value: str) -> int:
     hasher = FIELD_HASHERS.get(field)
     if hasher:
         return hasher(value)
     # 默认使用通用哈希
     return hash_field(value)
 
+
+class HashCache:
+    """
+    有界 LRU：(字段, 值) -> 哈希值
+
+    基于 OrderedDict（查找与移动到末尾都在 C 中完成），不加锁：
+    fgclient 在多线程中调用时，并发淘汰最多导致一次重复计算
+    """
+    __slots__ = ("maxsize", "data", "hits", "misses")
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.data: "OrderedDict[Tuple[str, str], int]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, field: str, value: str) -> int:
+        key = (field, value)
+        data = self.data
+        hashed = data.get(key)
+        if hashed is not None:
+            self.hits += 1
+            try:
+                data.move_to_end(key)
+            except KeyError:
+                pass  # 已被其他线程淘汰
+            return hashed
+        self.misses += 1
+        hashed = data[key] = _compute_hashed_value(field, value)
+        if len(data) > self.maxsize:
+            try:
+                data.popitem(last=False)
+            except KeyError:
+                pass
+        return hashed
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+_hash_cache: Optional[HashCache] = HashCache(DEFAULT_HASH_CACHE_SIZE)
+
+
+def configure_hash_cache(maxsize: int):
+    """设置哈希缓存大小（清空已有缓存与统计），0 为关闭缓存"""
+    global _hash_cache
+    _hash_cache = HashCache(maxsize) if maxsize > 0 else None
+
+
+def hash_cache_stats() -> Optional[Dict[str, float]]:
+    """哈希缓存的大小与命中率，关闭时返回 None"""
+    cache = _hash_cache
+    return cache.stats() if cache is not None else None
+
+
+def get_hashed_value(field: str, value: str) -> int:
+    """根据字段名获取哈希值（优先读取 LRU 缓存）"""
+    cache = _hash_cache
+    if cache is not None:
+        return cache.get(field, value)
+    return _compute_hashed_value(field, value)
+
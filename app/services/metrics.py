@@ -0,0 +1,139 @@
+"""运行指标（Prometheus 文本格式）
+
+热点路径上只做字典自增与一次二分查找，不加锁（单线程事件循环），
+每次记录在 1 µs 以内；抓取 /metrics 时才格式化输出。
+
+带项目 / key 标签的计数器有序列数上限（metrics_max_series），
+超出后新的标签组合计入 "__other__"，避免大量不存在的 key 撑爆内存和 Prometheus。
+
+指标按 worker 进程统计，多 worker 部署时由 Prometheus 分别抓取后聚合。
+"""
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Sequence, Tuple
+from app.config import get_settings
+
+settings = get_settings()
+
+OVERFLOW_LABEL = "__other__"
+
+# 数据库查询耗时分桶（秒）
+DB_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+# 条件计算耗时分桶（秒），编译后的谓词通常在微秒级
+EVAL_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 1e-3, 1e-2)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value: float) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Counter:
+    """计数器，标签值按 labelnames 顺序以元组传入"""
+    __slots__ = ("name", "help", "labelnames", "max_series", "values")
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (), max_series: int = 0):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.max_series = max_series  # 0 为不限制（只用于取值有限的标签）
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, labels: Tuple[str, ...] = (), amount: float = 1):
+        values = self.values
+        if labels in values:
+            values[labels] += amount
+        elif not self.max_series or len(values) < self.max_series:
+            values[labels] = amount
+        else:
+            overflow = (OVERFLOW_LABEL,) * len(labels)
+            values[overflow] = values.get(overflow, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in self.values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_number(value)}")
+        return lines
+
+
+class Histogram:
+    """直方图（无标签），以纳秒记录，输出时换算为秒"""
+    __slots__ = ("name", "help", "buckets", "_bounds_ns", "counts", "sum_ns")
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float]):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._bounds_ns = tuple(int(bound * 1e9) for bound in self.buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一个为 +Inf
+        self.sum_ns = 0
+
+    def observe_ns(self, elapsed_ns: int):
+        self.counts[bisect_left(self._bounds_ns, elapsed_ns)] += 1
+        self.sum_ns += elapsed_ns
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound!r}"}} {cumulative}')
+        cumulative += self.counts[-1]
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {cumulative}')
+        lines.append(f"{self.name}_sum {self.sum_ns / 1e9!r}")
+        lines.append(f"{self.name}_count {cumulative}")
+        return lines
+
+
+def render_gauge(name: str, help: str, value: float, metric_type: str = "gauge") -> List[str]:
+    """抓取时计算的单值指标"""
+    return [f"# HELP {name} {help}", f"# TYPE {name} {metric_type}", f"{name} {_format_number(value)}"]
+
+
+# ==================== 指标定义 ====================
+
+# result: hit（命中）、stale（命中但已软过期，后台刷新）、negative（负缓存命中）、
+# miss（发起加载）、coalesced（等待进行中的加载）
+cache_requests = Counter("fg_cache_requests_total", "项目缓存查询次数", ("result",))
+# reason: capacity（超过 cache_maxsize）、expired（超过硬过期时间）
+cache_evictions = Counter("fg_cache_evictions_total", "项目缓存淘汰次数", ("reason",))
+mongo_fetch_seconds = Histogram("fg_mongo_fetch_seconds", "加载项目时查询 MongoDB 的耗时", DB_BUCKETS)
+compile_seconds = Histogram("fg_compile_seconds", "编译项目快照的耗时", EVAL_BUCKETS)
+evaluation_seconds = Histogram("fg_evaluation_seconds", "/api/fg/check 条件计算耗时", EVAL_BUCKETS)
+check_requests = Counter(
+    "fg_check_requests_total", "/api/fg/check 请求数", ("project", "key", "result"), settings.metrics_max_series
+)
+get_requests = Counter(
+    "fg_get_requests_total", "/api/fg/get 请求数", ("project", "key"), settings.metrics_max_series
+)
+
+REGISTRY = (
+    cache_requests,
+    cache_evictions,
+    mongo_fetch_seconds,
+    compile_seconds,
+    evaluation_seconds,
+    check_requests,
+    get_requests,
+)
+
+
+def render_metrics(extra: Iterable[List[str]] = ()) -> str:
+    """输出所有指标（extra 为抓取时计算的指标）"""
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    for metric_lines in extra:
+        lines.extend(metric_lines)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,257 @@
+"""快照存储编码
+
+快照 YAML 分为两部分：snapshot 元数据（updated_by、remark）与快照内容（project、items）。
+元数据每次保存都不同，已作为字段保存在快照文档中，读取时重新生成；
+只有快照内容按以下方式之一保存在 data 字段中：
+- full：zlib 压缩的快照内容（基准快照）
+- delta：相对同一项目最近一个基准快照的差异（按行、逗号和空白切分，白名单中单个 ID 的增删也只记录该 ID），zlib 压缩
+- ref：快照内容与同一项目已有快照完全相同（content_hash 一致）时，只保存对该快照的引用
+
+每 snapshot_full_interval 个快照重新保存一次完整基准，差异体积接近完整压缩体积时也直接保存基准，
+因此读取任意快照最多只需解压一个基准加一个差异。
+旧版本保存的明文 yaml 字段（包含元数据的完整 YAML）仍可直接读取，也可作为差异的基准。
+"""
+import asyncio
+import hashlib
+import json
+import re
+import zlib
+from typing import List, Optional, Tuple, Union
+from bson import Binary, ObjectId
+from cachetools import LRUCache
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from app.config import get_settings
+
+settings = get_settings()
+
+ENCODING_FULL = "full"
+ENCODING_DELTA = "delta"
+ENCODING_REF = "ref"
+
+# 差异压缩后超过完整压缩体积的该比例时，直接保存完整基准
+MAX_DELTA_RATIO = 0.5
+
+# 超过该大小（字节）的快照在线程池中计算差异和压缩，避免阻塞事件循环
+THREAD_ENCODE_MIN_SIZE = 64 * 1024
+
+# 已解码的基准快照（基准创建后不再修改，可以安全缓存）
+_base_cache: LRUCache = LRUCache(maxsize=8)
+
+# 差异的切分单位：以逗号或空白结尾的片段（逗号分隔的白名单在 YAML 中只占一行）
+_TOKEN_PATTERN = re.compile(r"[^,\s]*[,\s]|[^,\s]+")
+
+# 差异操作：[start, end] 表示复制基准的第 start~end 个片段，字符串表示新增的文本
+DeltaOp = Union[List[int], str]
+
+
+class SnapshotDataError(Exception):
+    """快照数据无法还原（基准缺失或编码未知）"""
+
+
+def content_hash(content: str) -> str:
+    """快照内容哈希，用于去重（不包含元数据）"""
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def _tokenize(text: str) -> List[str]:
+    return _TOKEN_PATTERN.findall(text)
+
+
+def make_delta(base: str, new: str) -> List[DeltaOp]:
+    """
+    计算 new 相对 base 的差异
+
+    贪心匹配：优先延续上一段复制的位置，否则按片段内容查找基准中的第一次出现，
+    时间复杂度与片段数成线性，适用于包含大量白名单的快照
+    """
+    base_tokens = _tokenize(base)
+    new_tokens = _tokenize(new)
+    first_index = {}
+    for i, token in enumerate(base_tokens):
+        first_index.setdefault(token, i)
+
+    ops: List[DeltaOp] = []
+    literal: List[str] = []
+    m, n = len(base_tokens), len(new_tokens)
+    i = j = 0
+    next_i = 0
+    while j < n:
+        token = new_tokens[j]
+        if next_i < m and base_tokens[next_i] == token:
+            i = next_i
+        else:
+            i = first_index.get(token, -1)
+        if i < 0:
+            # 新增片段；next_i 不变，插入后的片段仍可从原位置继续复制
+            literal.append(token)
+            j += 1
+            continue
+
+        start = i
+        while j < n and i < m and base_tokens[i] == new_tokens[j]:
+            i += 1
+            j += 1
+        if literal:
+            ops.append("".join(literal))
+            literal = []
+        if ops and isinstance(ops[-1], list) and ops[-1][1] == start:
+            ops[-1][1] = i
+        else:
+            ops.append([start, i])
+        next_i = i
+
+    if literal:
+        ops.append("".join(literal))
+    return ops
+
+
+def apply_delta(base: str, ops: List[DeltaOp]) -> str:
+    """按差异还原内容"""
+    base_tokens = _tokenize(base)
+    parts = []
+    for op in ops:
+        if isinstance(op, str):
+            parts.append(op)
+        else:
+            parts.extend(base_tokens[op[0]:op[1]])
+    return "".join(parts)
+
+
+def _compress(text: str) -> Binary:
+    return Binary(zlib.compress(text.encode()))
+
+
+def _decompress(data: bytes) -> str:
+    return zlib.decompress(data).decode()
+
+
+def _compress_with_delta(content: str, base: str) -> Tuple[Binary, Binary]:
+    """同时计算完整压缩和差异压缩，用于比较体积"""
+    delta = make_delta(base, content)
+    return _compress(content), _compress(json.dumps(delta, ensure_ascii=False, separators=(",", ":")))
+
+
+async def _run_encode(func, content: str, *args):
+    """大快照在线程池中编码"""
+    if len(content) >= THREAD_ENCODE_MIN_SIZE:
+        return await asyncio.to_thread(func, content, *args)
+    return func(content, *args)
+
+
+async def _find_snapshot(db: AsyncIOMotorDatabase, snapshot_id: ObjectId) -> dict:
+    snapshot = await db.snapshots.find_one({"_id": snapshot_id})
+    if not snapshot:
+        raise SnapshotDataError(f"快照 {snapshot_id} 引用的快照不存在")
+    return snapshot
+
+
+async def _load_base(db: AsyncIOMotorDatabase, base_id: ObjectId) -> str:
+    """读取基准快照的存储内容（带缓存）"""
+    key = str(base_id)
+    text = _base_cache.get(key)
+    if text is None:
+        base = await _find_snapshot(db, base_id)
+        if base.get("encoding") not in (None, ENCODING_FULL):
+            raise SnapshotDataError(f"快照 {base_id} 不是完整基准")
+        text = decode_snapshot(base)
+        _base_cache[key] = text
+    return text
+
+
+def decode_snapshot(snapshot: dict) -> str:
+    """还原不依赖其他快照的快照（full 为快照内容，旧版明文为完整 YAML）"""
+    encoding = snapshot.get("encoding")
+    if encoding is None:
+        return snapshot["yaml"]
+    if encoding == ENCODING_FULL:
+        return _decompress(snapshot["data"])
+    raise SnapshotDataError(f"快照 {snapshot.get('_id')} 需要读取基准才能还原")
+
+
+async def load_snapshot_yaml(db: AsyncIOMotorDatabase, snapshot: dict, header: str) -> str:
+    """
+    还原快照的完整 YAML
+
+    header 为按快照文档的 updated_by、remark 生成的元数据部分，拼接在快照内容之前；
+    旧版明文 yaml 字段本身包含元数据，直接返回
+    """
+    if snapshot.get("encoding") is None:
+        return snapshot["yaml"]
+    return header + await load_snapshot_content(db, snapshot)
+
+
+async def load_snapshot_content(db: AsyncIOMotorDatabase, snapshot: dict) -> str:
+    """还原快照内容（不含元数据）"""
+    encoding = snapshot.get("encoding")
+    if encoding == ENCODING_FULL:
+        return decode_snapshot(snapshot)
+    if encoding == ENCODING_REF:
+        target = await _find_snapshot(db, snapshot["base_id"])
+        if target.get("encoding") not in (ENCODING_FULL, ENCODING_DELTA):
+            raise SnapshotDataError(f"快照 {snapshot['_id']} 引用的快照不是 full 或 delta")
+        return await load_snapshot_content(db, target)
+    if encoding == ENCODING_DELTA:
+        base = await _load_base(db, snapshot["base_id"])
+        ops = json.loads(_decompress(snapshot["data"]))
+        return apply_delta(base, ops)
+    raise SnapshotDataError(f"未知的快照编码: {encoding}")
+
+
+async def _find_delta_base(db: AsyncIOMotorDatabase, project_id: str) -> Optional[Tuple[ObjectId, int]]:
+    """
+    查找新快照可以使用的基准，返回 (基准 id, 新快照的 chain)
+
+    项目还没有快照，或距离基准的差异个数已达到 snapshot_full_interval 时返回 None（保存完整基准）
+    """
+    projection = {"_id": 1, "encoding": 1, "base_id": 1, "chain": 1}
+    latest = await db.snapshots.find_one(
+        {"project_id": project_id},
+        projection,
+        sort=[("updated_at", -1), ("_id", -1)]
+    )
+    if latest is not None and latest.get("encoding") == ENCODING_REF:
+        latest = await db.snapshots.find_one({"_id": latest["base_id"]}, projection)
+    if latest is None:
+        return None
+
+    chain = latest.get("chain", 0) + 1
+    if chain >= settings.snapshot_full_interval:
+        return None
+    base_id = latest["base_id"] if latest.get("encoding") == ENCODING_DELTA else latest["_id"]
+    return base_id, chain
+
+
+async def encode_snapshot(db: AsyncIOMotorDatabase, project_id: str, content: str) -> dict:
+    """
+    生成快照的存储字段（encoding、data、base_id、chain、content_hash、size）
+
+    content 为快照内容（project、items 部分的 YAML，不含元数据）；
+    chain 为该快照距离其基准的差异个数，基准为 0
+    """
+    digest = content_hash(content)
+    fields = {"content_hash": digest, "size": len(content)}
+
+    # 项目配置未变化（只有操作者、备注不同）的快照只保存引用
+    duplicate = await db.snapshots.find_one(
+        {"project_id": project_id, "content_hash": digest},
+        {"_id": 1, "encoding": 1, "base_id": 1, "chain": 1}
+    )
+    if duplicate:
+        target_id = duplicate["base_id"] if duplicate.get("encoding") == ENCODING_REF else duplicate["_id"]
+        return {**fields, "encoding": ENCODING_REF, "base_id": target_id, "chain": duplicate.get("chain", 0)}
+
+    full = {**fields, "encoding": ENCODING_FULL, "chain": 0}
+    delta_base = await _find_delta_base(db, project_id)
+    if delta_base is not None:
+        base_id, chain = delta_base
+        try:
+            base = await _load_base(db, base_id)
+        except SnapshotDataError:
+            base = None
+        if base is not None:
+            full_data, delta_data = await _run_encode(_compress_with_delta, content, base)
+            if len(delta_data) > len(full_data) * MAX_DELTA_RATIO:
+                return {**full, "data": full_data}
+            return {**fields, "encoding": ENCODING_DELTA, "data": delta_data, "base_id": base_id, "chain": chain}
+
+    return {**full, "data": await _run_encode(_compress, content)}
@@ -0,0 +1,170 @@
+"""条件计算追踪（explain）
+
+逐个执行编译后的条件组与条件，记录计算路径、短路位置、哈希值与分桶结果，以及每一步的耗时（纳秒）。
+追踪走独立的代码路径，不修改热点路径上的谓词：未开启时没有任何额外开销。
+
+- 显式追踪：/api/fg/check 带 explain 参数、/api/fg/debug 请求 explain=true 时返回追踪结果
+- 采样追踪：FG_TRACE_SAMPLE_RATE > 0 时按比例记录线上请求的追踪结果，
+  保存在每个 worker 的环形缓冲区（最近 FG_TRACE_BUFFER_SIZE 条），通过 /api/fg/traces 查看
+
+耗时包含追踪本身的计时开销，适合比较各步骤的相对耗时。
+"""
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional
+from app.config import get_settings
+from app.services.compiler import (
+    COMPARATORS,
+    HASH_OPERATORS,
+    VALUE_OPERATORS,
+    CompiledGroup,
+    CompiledItem,
+    HashCondition,
+    RolloutCondition,
+    ValueCondition,
+)
+from app.services.evaluator import ROLLOUT_BUCKETS
+from app.services.hash import get_hashed_value
+
+settings = get_settings()
+
+# 采样比例（0 为关闭）
+sample_rate = max(0.0, min(1.0, settings.fg_trace_sample_rate))
+
+# 最近的采样追踪
+sampled_traces: Deque[Dict[str, Any]] = deque(maxlen=max(1, settings.fg_trace_buffer_size))
+
+# 编译后的函数 -> 运算符名称
+_VALUE_OPERATOR_NAMES = {func: name for name, func in VALUE_OPERATORS.items()}
+_HASH_OPERATOR_NAMES = {func: name for name, func in HASH_OPERATORS.items()}
+_COMPARATOR_NAMES = {func: name for name, func in COMPARATORS.items()}
+
+
+def _trace_condition(index: int, condition, context: Dict[str, str], hashes: Dict[str, int]) -> Dict[str, Any]:
+    """执行单个条件并记录结果与耗时"""
+    started = time.perf_counter_ns()
+    result = condition(context, hashes)
+    elapsed = time.perf_counter_ns() - started
+
+    step: Dict[str, Any] = {"index": index, "field": condition.field}
+    field_value = context.get(condition.field)
+    if isinstance(condition, ValueCondition):
+        step["operator"] = _VALUE_OPERATOR_NAMES.get(condition.compare)
+        if isinstance(condition.operand, frozenset):
+            step["list_size"] = len(condition.operand)  # 名单可能很大，只返回大小
+        else:
+            step["value"] = condition.operand
+    elif isinstance(condition, RolloutCondition):
+        step["operator"] = "rollout"
+        step["percentage"] = condition.end * 100 / ROLLOUT_BUCKETS
+        step["bucket_range"] = [0, condition.end]
+        if field_value is not None:
+            hashed = hashes.get(condition.field)
+            if hashed is None:
+                hashed = get_hashed_value(condition.field, field_value)
+            step["hash"] = hashed
+            step["bucket"] = hashed % ROLLOUT_BUCKETS
+    elif isinstance(condition, HashCondition):
+        step["operator"] = _HASH_OPERATOR_NAMES.get(condition.operator)
+        step["value"] = condition.value
+        step["comparator"] = _COMPARATOR_NAMES.get(condition.comparator)
+        step["target"] = condition.target
+        if field_value is not None:
+            # 执行条件时已写入 hashes，这里不再重复计算
+            hashed = hashes.get(condition.field)
+            if hashed is None:
+                hashed = get_hashed_value(condition.field, field_value)
+            step["hash"] = hashed
+            step["bucket"] = condition.operator(hashed, condition.value)
+    if field_value is None:
+        step["missing_field"] = True
+    step["result"] = result
+    step["elapsed_ns"] = elapsed
+    return step
+
+
+def _trace_group(index: int, group: CompiledGroup, context: Dict[str, str], hashes: Dict[str, int]) -> Dict[str, Any]:
+    """执行条件组：OR 遇到满足的条件、AND 遇到不满足的条件即短路，之后的条件标记为 skipped"""
+    started = time.perf_counter_ns()
+    steps: List[Dict[str, Any]] = []
+    short_circuit: Optional[int] = None
+    result = True
+    for i, condition in enumerate(group.conditions):
+        if short_circuit is not None:
+            steps.append({"index": i, "field": condition.field, "skipped": True})
+            continue
+        step = _trace_condition(i, condition, context, hashes)
+        steps.append(step)
+        if step["result"] == group.match_any:
+            short_circuit = i
+    if group.conditions:
+        result = short_circuit is not None if group.match_any else short_circuit is None
+    return {
+        "index": index,
+        "logic": "or" if group.match_any else "and",
+        "result": result,
+        "short_circuit": short_circuit,
+        "conditions": steps,
+        "elapsed_ns": time.perf_counter_ns() - started,
+    }
+
+
+def explain_item(item: CompiledItem, context: Dict[str, str]) -> Dict[str, Any]:
+    """
+    追踪 item 的计算过程（结果与 CompiledItem.evaluate 一致）
+
+    返回结构：
+    {
+        "item": 名称, "enabled": 开关, "result": 计算结果,
+        "decided_by": "disabled" | "no_conditions" | {"group": i, "condition": j} | None（没有满足的组）,
+        "groups": [{"index", "logic", "result", "short_circuit", "conditions": [...], "elapsed_ns"}, ...],
+        "elapsed_ns": 总耗时
+    }
+    """
+    started = time.perf_counter_ns()
+    trace: Dict[str, Any] = {"item": item.name, "enabled": item.enabled, "context": dict(context)}
+    groups: List[Dict[str, Any]] = []
+    result = False
+    decided_by: Any = None
+
+    if not item.enabled:
+        decided_by = "disabled"
+    elif not item.groups:
+        result = True
+        decided_by = "no_conditions"
+    else:
+        hashes: Dict[str, int] = {}
+        for i, group in enumerate(item.groups):
+            if result:
+                groups.append({"index": i, "skipped": True})
+                continue
+            group_trace = _trace_group(i, group, context, hashes)
+            groups.append(group_trace)
+            if group_trace["result"]:
+                # 组间 OR：第一个满足的组决定结果
+                result = True
+                decided_by = {"group": i, "condition": group_trace["short_circuit"]}
+
+    trace["result"] = result
+    trace["decided_by"] = decided_by
+    trace["groups"] = groups
+    trace["elapsed_ns"] = time.perf_counter_ns() - started
+    return trace
+
+
+def record_sample(project: str, key: str, trace: Dict[str, Any]):
+    """记录一条采样追踪"""
+    sampled_traces.append({
+        "time": datetime.utcnow().isoformat(),
+        "project": project,
+        "key": key,
+        "trace": trace,
+    })
+
+
+def get_sampled_traces(limit: int = 100) -> List[Dict[str, Any]]:
+    """最近的采样追踪（新的在前）"""
+    traces = list(sampled_traces)
+    traces.reverse()
+    return traces[:limit]
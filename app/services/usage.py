@@ -0,0 +1,120 @@
+"""功能项使用统计
+
+热点路径上只在进程内的字典中计数，键为 (项目名称, item 名称, 结果)，
+后台任务每隔 USAGE_FLUSH_INTERVAL_SECONDS 秒把计数批量写入 flag_usage 集合
+（每个 item 一次 $inc，一次 bulk_write），不为每个请求写数据库。
+
+结果取值：
+- true / false：/api/fg/check、/api/fg/evaluate、/api/fg/evaluate_all 的计算结果
+- off：item 已关闭
+- value：/api/fg/get 读取配置值
+
+写入失败时计数合并回内存，下次重试；应用关闭时（lifespan）最后写入一次，
+进程被强制终止时最多丢失一个写入周期的计数。
+"""
+import asyncio
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+from app.config import get_settings
+
+settings = get_settings()
+
+OUTCOMES = ("true", "false", "off", "value")
+
+# (项目名称, item 名称, 结果) -> 自上次写入以来的次数
+_counts: Dict[Tuple[str, str, str], int] = {}
+
+_flush_task: Optional[asyncio.Task] = None
+
+
+def record_usage(project: str, key: str, outcome: str):
+    """计数一次（只修改内存中的字典）"""
+    counter_key = (project, key, outcome)
+    _counts[counter_key] = _counts.get(counter_key, 0) + 1
+
+
+def pending_count() -> int:
+    """尚未写入的计数条目数"""
+    return len(_counts)
+
+
+async def flush_usage(db: AsyncIOMotorDatabase) -> int:
+    """
+    把当前计数写入 flag_usage，返回写入的 item 数
+
+    先整体换出计数字典再写入，写入期间的新计数进入新字典，互不影响
+    """
+    global _counts
+    if not _counts:
+        return 0
+    counts, _counts = _counts, {}
+
+    # 同一 item 的多个结果合并为一次 $inc
+    increments: Dict[Tuple[str, str], Dict[str, int]] = {}
+    for (project, key, outcome), count in counts.items():
+        inc = increments.setdefault((project, key), {"total": 0})
+        inc[outcome] = inc.get(outcome, 0) + count
+        inc["total"] += count
+
+    now = datetime.utcnow()
+    operations = [
+        UpdateOne(
+            {"project": project, "key": key},
+            {
+                "$inc": inc,
+                "$set": {"last_evaluated_at": now},
+                "$setOnInsert": {"first_evaluated_at": now},
+            },
+            upsert=True,
+        )
+        for (project, key), inc in increments.items()
+    ]
+    try:
+        await db.flag_usage.bulk_write(operations, ordered=False)
+    except PyMongoError as e:
+        # 合并回内存，下次重试（不区分部分成功，最多重复计数一个周期）
+        _restore(counts)
+        print(f"写入功能项使用统计失败: {e}")
+        return 0
+    except asyncio.CancelledError:
+        # 关闭时取消了进行中的写入，由最后一次写入带上
+        _restore(counts)
+        raise
+    return len(operations)
+
+
+def _restore(counts: Dict[Tuple[str, str, str], int]):
+    for counter_key, count in counts.items():
+        _counts[counter_key] = _counts.get(counter_key, 0) + count
+
+
+async def _flush_periodically(db: AsyncIOMotorDatabase, interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await flush_usage(db)
+        except Exception as e:
+            print(f"写入功能项使用统计异常: {e!r}")
+
+
+def start_usage_flusher(db: AsyncIOMotorDatabase):
+    """启动后台写入任务"""
+    global _flush_task
+    if _flush_task is None or _flush_task.done():
+        _flush_task = asyncio.create_task(_flush_periodically(db, settings.usage_flush_interval_seconds))
+
+
+async def stop_usage_flusher(db: AsyncIOMotorDatabase):
+    """停止后台写入任务，并写入剩余的计数"""
+    global _flush_task
+    if _flush_task is not None:
+        _flush_task.cancel()
+        try:
+            await _flush_task
+        except (asyncio.CancelledError, Exception):
+            pass
+        _flush_task = None
+    await flush_usage(db)
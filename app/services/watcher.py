@@ -0,0 +1,129 @@
+"""项目配置变更监听
+
+通过 MongoDB Change Streams 监听 projects 集合，把变更推送到本进程的缓存：
+- insert / update / replace：本进程已缓存的项目编译新的快照并替换缓存，
+  未缓存的项目只清除负缓存，等到有请求时再加载
+- delete：按项目 ID 清除缓存
+
+缓存更新后通知 /api/fg/stream 的订阅者（app.services.broadcast）。
+
+每个 worker 各自运行一个监听任务，任意 worker（或 Pod）保存配置后，
+所有 worker 都能在秒级内看到新配置，CACHE_TTL_SECONDS 只作为兜底。
+Change Streams 需要副本集（单节点副本集即可），不可用时自动退化为仅依赖 TTL。
+"""
+import asyncio
+from typing import Any, Dict, Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import OperationFailure, PyMongoError
+from app.services.broadcast import publish_all_changes, publish_project_change
+from app.services.cache import (
+    clear_all_cache,
+    invalidate_cache,
+    invalidate_cache_by_id,
+    project_cache,
+    replace_cached_project,
+)
+from app.services.compiler import compile_project
+
+# 非副本集部署不支持 Change Streams
+_NOT_SUPPORTED_CODES = {40573}
+# resume token 失效，需要从头开始监听
+_RESUME_FAILED_CODES = {260, 280, 286}
+
+_watch_task: Optional[asyncio.Task] = None
+
+
+def apply_change(change: Dict[str, Any]):
+    """把一条变更事件应用到缓存"""
+    operation = change.get("operationType")
+    project_id = str(change.get("documentKey", {}).get("_id", ""))
+
+    if operation in ("insert", "update", "replace"):
+        project_doc = change.get("fullDocument")
+        if project_doc:
+            project_name = project_doc["name"]
+            if project_name in project_cache:
+                replace_cached_project(project_name, compile_project(project_doc))
+            else:
+                # 未缓存的项目不编译（每个 worker 都会收到所有项目的变更）
+                invalidate_cache(project_name)
+            publish_project_change(project_name)
+        else:
+            # 文档在查询完整文档前已被删除
+            _invalidate_and_publish(project_id)
+    elif operation == "delete":
+        _invalidate_and_publish(project_id)
+    elif operation in ("drop", "rename", "dropDatabase", "invalidate"):
+        clear_all_cache()
+        publish_all_changes()
+
+
+def _invalidate_and_publish(project_id: str):
+    """按 ID 清除缓存并通知订阅者（不知道项目名称时通知所有频道）"""
+    project_name = invalidate_cache_by_id(project_id)
+    if project_name is not None:
+        publish_project_change(project_name)
+    else:
+        publish_all_changes()
+
+
+async def watch_projects(db: AsyncIOMotorDatabase, max_backoff: float = 30):
+    """持续监听 projects 集合，断线后自动重连并从 resume token 继续"""
+    resume_token = None
+    backoff = 1.0
+    first_run = True
+
+    while True:
+        try:
+            async with db.projects.watch(full_document="updateLookup", resume_after=resume_token) as stream:
+                if resume_token is None and not first_run:
+                    # 无法续接，断线期间的变更可能已丢失，清空缓存
+                    clear_all_cache()
+                    publish_all_changes()
+                first_run = False
+                backoff = 1.0
+                print("已开始监听项目配置变更")
+                async for change in stream:
+                    try:
+                        apply_change(change)
+                    except Exception as e:
+                        # 无法应用的变更，清空缓存以保证不会读到旧配置
+                        print(f"应用项目配置变更失败: {e}")
+                        clear_all_cache()
+                        publish_all_changes()
+                    resume_token = stream.resume_token
+        except asyncio.CancelledError:
+            raise
+        except OperationFailure as e:
+            if e.code in _NOT_SUPPORTED_CODES:
+                print("MongoDB 未启用副本集，无法监听配置变更，缓存仅依赖 TTL 过期")
+                return
+            if e.code in _RESUME_FAILED_CODES:
+                resume_token = None
+            print(f"监听项目配置变更失败: {e}")
+        except PyMongoError as e:
+            print(f"监听项目配置变更中断: {e}")
+        except Exception as e:
+            print(f"监听项目配置变更异常: {e!r}")
+
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, max_backoff)
+
+
+def start_project_watcher(db: AsyncIOMotorDatabase):
+    """启动后台监听任务"""
+    global _watch_task
+    if _watch_task is None or _watch_task.done():
+        _watch_task = asyncio.create_task(watch_projects(db))
+
+
+async def stop_project_watcher():
+    """停止后台监听任务"""
+    global _watch_task
+    if _watch_task is not None:
+        _watch_task.cancel()
+        try:
+            await _watch_task
+        except (asyncio.CancelledError, Exception):
+            pass
+        _watch_task = None
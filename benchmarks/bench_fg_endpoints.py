@@ -0,0 +1,147 @@
+"""/api/fg/check、/api/fg/get 吞吐基准测试
+
+对比旧实现（构建 FGCheckResponse / FGGetResponse，经过 response_model 校验与序列化）
+与当前实现（预构建的字节模板 + orjson，直接返回 Response）的单进程每秒请求数。
+
+直接调用 ASGI 应用（不经过网络和 HTTP 客户端），只衡量路由、处理函数与序列化的开销；
+项目提前写入缓存，不需要数据库。
+
+用法：
+    python benchmarks/bench_fg_endpoints.py --requests 20000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import Optional
+from urllib.parse import urlencode
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import Depends, FastAPI  # noqa: E402
+from motor.motor_asyncio import AsyncIOMotorDatabase  # noqa: E402
+
+from app.deps import get_db  # noqa: E402
+from app.routers import fg  # noqa: E402
+from app.services.cache import project_cache, set_cached_project  # noqa: E402
+from app.services.compiler import compile_project  # noqa: E402
+from app.services.fastjson import orjson  # noqa: E402
+
+PROJECT = "bench"
+PROJECT_DOC = {
+    "_id": "0" * 24,
+    "name": PROJECT,
+    "items": [
+        {"name": "new_chat_ui", "enabled": True, "value": "v2", "conditions": [], "condition_groups": [
+            {"logic": "and", "conditions": [
+                {"field": "user_id", "operator": "%", "value": 100, "comparator": "<", "target": 50},
+            ]},
+        ]},
+        {"name": "api_endpoint", "enabled": True, "value": "https://api.example.com/v2", "conditions": [], "condition_groups": []},
+    ],
+}
+
+
+def build_legacy_app() -> FastAPI:
+    """旧实现：返回 Pydantic 模型，由 FastAPI 按 response_model 校验并序列化"""
+    app = FastAPI()
+
+    @app.get("/api/fg/check", response_model=fg.FGCheckResponse)
+    async def check(
+        project: str,
+        key: str,
+        user_id: Optional[str] = None,
+        chat_id: Optional[str] = None,
+        email: Optional[str] = None,
+        db: AsyncIOMotorDatabase = Depends(get_db)
+    ):
+        cached_item = await fg._get_compiled_item(project, key, db)
+        if not cached_item.enabled:
+            return fg.FGCheckResponse(enabled=False, key=key)
+        context = fg._build_context(user_id, chat_id, email)
+        return fg.FGCheckResponse(enabled=cached_item.evaluate(context), key=key)
+
+    @app.get("/api/fg/get", response_model=fg.FGGetResponse)
+    async def get(project: str, key: str, db: AsyncIOMotorDatabase = Depends(get_db)):
+        cached_item = await fg._get_compiled_item(project, key, db)
+        if not cached_item.enabled:
+            return fg.FGGetResponse(value="", key=key)
+        return fg.FGGetResponse(value=cached_item.value, key=key)
+
+    return app
+
+
+def build_current_app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(fg.router)
+    return app
+
+
+async def call(app, path: str, query: dict) -> bytes:
+    """以最小开销调用一次 ASGI 应用，返回响应体"""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": urlencode(query).encode(),
+        "root_path": "",
+        "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 0),
+        "server": ("bench", 80),
+    }
+    body = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            body.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return b"".join(body)
+
+
+async def measure(app, path: str, queries: list, requests: int) -> float:
+    """顺序执行 requests 次请求，返回每秒请求数"""
+    for query in queries[:100]:
+        await call(app, path, query)  # 预热
+    start = time.perf_counter()
+    for i in range(requests):
+        await call(app, path, queries[i % len(queries)])
+    return requests / (time.perf_counter() - start)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="/api/fg/check、/api/fg/get 吞吐基准测试")
+    parser.add_argument("--requests", type=int, default=20000, help="每个场景的请求数")
+    args = parser.parse_args()
+
+    set_cached_project(PROJECT, compile_project(PROJECT_DOC))
+    project_cache[PROJECT].refresh_at = float("inf")  # 测试期间不触发后台刷新
+
+    legacy_app = build_legacy_app()
+    current_app = build_current_app()
+
+    check_queries = [{"project": PROJECT, "key": "new_chat_ui", "user_id": f"user-{i}"} for i in range(1000)]
+    get_queries = [{"project": PROJECT, "key": "api_endpoint"}]
+
+    for path, queries in (("/api/fg/check", check_queries), ("/api/fg/get", get_queries)):
+        legacy_body = await call(legacy_app, path, queries[0])
+        current_body = await call(current_app, path, queries[0])
+        assert legacy_body == current_body, (legacy_body, current_body)
+
+    print(f"JSON: {'orjson ' + orjson.__version__ if orjson else '标准库 json'}")
+    for path, queries in (("/api/fg/check", check_queries), ("/api/fg/get", get_queries)):
+        legacy_rps = await measure(legacy_app, path, queries, args.requests)
+        current_rps = await measure(current_app, path, queries, args.requests)
+        print(f"{path}: 旧 {legacy_rps:,.0f} req/s, 新 {current_rps:,.0f} req/s, 提升 {current_rps / legacy_rps - 1:+.0%}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,121 @@
+"""快照 YAML 生成基准测试
+
+对比旧实现（纯 Python yaml.dump，在事件循环中执行）与当前实现
+（libyaml CSafeDumper，大项目在线程池中执行）：
+- 单次生成耗时
+- 生成期间事件循环的最大停顿（每 1ms 调度一次的协程观测到的最大间隔）
+
+用法：
+    python benchmarks/bench_snapshot_yaml.py --items 50 --whitelist-size 20000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.routers.snapshots import SnapshotDumper, build_snapshot_yaml, generate_snapshot_content  # noqa: E402
+
+
+def make_project(item_count: int, whitelist_size: int) -> dict:
+    """构造测试项目：每个 item 一个白名单条件和一个百分比条件"""
+    items = []
+    for i in range(item_count):
+        whitelist = ",".join(f"user_{i}_{n}" for n in range(whitelist_size))
+        items.append({
+            "name": f"feature.{i}",
+            "description": f"功能 {i}",
+            "enabled": True,
+            "value": "",
+            "conditions": [],
+            "condition_groups": [
+                {"logic": "or", "conditions": [
+                    {"field": "user_id", "operator": "in", "value": whitelist, "comparator": None, "target": None},
+                    {"field": "user_id", "operator": "%", "value": 100, "comparator": "<", "target": 10},
+                ]},
+            ],
+        })
+    return {"_id": "0" * 24, "name": "bench", "created_at": datetime(2024, 1, 1), "items": items}
+
+
+def legacy_dump(project: dict, remark: str = "", updated_by: str = "") -> str:
+    """旧实现：纯 Python Dumper"""
+    snapshot_data = {
+        "snapshot": {"updated_by": updated_by, "remark": remark},
+        "project": {
+            "id": str(project["_id"]),
+            "name": project["name"],
+            "created_at": project["created_at"].isoformat()
+        },
+        "items": project.get("items", [])
+    }
+    return yaml.dump(snapshot_data, allow_unicode=True, sort_keys=False)
+
+
+async def measure_loop_stall(make_coro) -> float:
+    """执行 make_coro() 期间事件循环的最大停顿（毫秒）"""
+    stop = asyncio.Event()
+    max_gap = 0.0
+
+    async def ticker():
+        nonlocal max_gap
+        last = time.perf_counter()
+        while not stop.is_set():
+            await asyncio.sleep(0.001)
+            now = time.perf_counter()
+            max_gap = max(max_gap, now - last)
+            last = now
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)
+    await make_coro()
+    stop.set()
+    await task
+    return max_gap * 1000
+
+
+def time_call(func, repeat: int) -> float:
+    """多次执行取中位数（毫秒）"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="快照 YAML 生成基准测试")
+    parser.add_argument("--items", type=int, default=50, help="item 数量")
+    parser.add_argument("--whitelist-size", type=int, default=2000, help="每个 item 白名单中的 ID 数量")
+    parser.add_argument("--repeat", type=int, default=5, help="重复次数")
+    args = parser.parse_args()
+
+    project = make_project(args.items, args.whitelist_size)
+    legacy_text = legacy_dump(project)
+    current_text = build_snapshot_yaml(project)
+
+    print(f"项目: {args.items} items, 每个白名单 {args.whitelist_size} 个 ID, YAML {len(current_text) / 1024:.0f} KB")
+    print(f"Dumper: {SnapshotDumper.__name__}")
+    print(f"内容一致: {yaml.safe_load(legacy_text) == yaml.safe_load(current_text)}（文本完全相同: {legacy_text == current_text}）")
+
+    legacy_ms = time_call(lambda: legacy_dump(project), args.repeat)
+    current_ms = time_call(lambda: build_snapshot_yaml(project), args.repeat)
+    print(f"生成耗时（中位数）: 旧 {legacy_ms:.1f} ms, 新 {current_ms:.1f} ms, 加速 {legacy_ms / current_ms:.1f}x")
+
+    async def legacy_on_loop():
+        legacy_dump(project)
+
+    legacy_stall = await measure_loop_stall(legacy_on_loop)
+    current_stall = await measure_loop_stall(lambda: generate_snapshot_content(project))
+    print(f"事件循环最大停顿: 旧 {legacy_stall:.1f} ms, 新 {current_stall:.1f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,51 @@
+"""基准测试用的内存 MongoDB 替身
+
+只实现 /api/fg/* 用到的 Motor 接口（按字段相等匹配的 find_one），
+用于在没有 MongoDB 的环境下通过 ASGI 客户端压测接口。
+可选的 latency 模拟一次数据库往返的耗时，让缓存未命中的场景更接近真实部署。
+"""
+import asyncio
+import copy
+from typing import Any, Dict, List, Optional
+
+
+class InMemoryCollection:
+    """内存集合"""
+
+    def __init__(self, latency: float = 0.0):
+        self.documents: List[Dict[str, Any]] = []
+        self.latency = latency
+        self.find_count = 0
+
+    def insert(self, document: Dict[str, Any]):
+        self.documents.append(copy.deepcopy(document))
+
+    async def find_one(self, filter: Optional[Dict[str, Any]] = None, *args, **kwargs) -> Optional[Dict[str, Any]]:
+        """返回第一个所有字段都相等的文档（副本），不支持查询操作符"""
+        self.find_count += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        filter = filter or {}
+        for document in self.documents:
+            if all(document.get(field) == value for field, value in filter.items()):
+                return copy.deepcopy(document)
+        return None
+
+
+class InMemoryDatabase:
+    """内存数据库：按属性名访问集合，不存在时自动创建"""
+
+    def __init__(self, latency: float = 0.0):
+        self._latency = latency
+        self._collections: Dict[str, InMemoryCollection] = {}
+
+    def __getattr__(self, name: str) -> InMemoryCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = InMemoryCollection(self._latency)
+        return collection
+
+    def __getitem__(self, name: str) -> InMemoryCollection:
+        return getattr(self, name)
@@ -0,0 +1,406 @@
+"""可复现的基准测试套件
+
+覆盖三层：
+- micro：evaluate_condition、evaluate_condition_groups、hash_field（及带 LRU 的 get_hashed_value）以及编译后谓词，
+  覆盖不同规则形态（大白名单、大量条件组、哈希灰度）
+- endpoints：通过 ASGI 客户端（httpx.ASGITransport）顺序请求 /api/fg/* 接口，
+  数据库替换为内存替身（benchmarks/memory_db.py），包含缓存命中与未命中场景
+- load：并发客户端持续请求 /api/fg/check，期间周期性使缓存失效（模拟配置变更），
+  统计吞吐、延迟分位数与数据库查询次数
+
+结果写入 JSON（附带 Python 版本、平台、git 提交等环境信息），可用 --compare 与之前的结果对比。
+
+用法：
+    python benchmarks/suite.py                          # 运行全部，结果写入 benchmarks/results/
+    python benchmarks/suite.py --layers micro --quick   # 只运行微基准，缩短时间
+    python benchmarks/suite.py --compare benchmarks/results/baseline.json
+    python benchmarks/suite.py --compare old.json new.json   # 只对比两个已有结果，不运行
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # app.main 以相对路径挂载静态文件
+
+import httpx  # noqa: E402
+
+from app.deps import get_db  # noqa: E402
+from app.main import app  # noqa: E402
+from app.services import cache  # noqa: E402
+from app.services.compiler import compile_item, compile_project  # noqa: E402
+from app.services.evaluator import evaluate_condition, evaluate_condition_groups  # noqa: E402
+from app.services.fastjson import orjson  # noqa: E402
+from app.services.hash import get_hashed_value, hash_field  # noqa: E402
+from memory_db import InMemoryDatabase  # noqa: E402
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+PROJECT = "bench"
+WHITELIST_SIZE = 10000
+GROUP_COUNT = 50
+
+ROLLOUT = {"field": "user_id", "operator": "%", "value": 100, "comparator": "<", "target": 20}
+ROLLOUT_NATIVE = {"field": "user_id", "operator": "rollout", "value": 20}
+WHITELIST_VALUES = [f"user-{i}" for i in range(WHITELIST_SIZE)]
+WHITELIST_STR = {"field": "user_id", "operator": "in", "value": ",".join(WHITELIST_VALUES)}
+WHITELIST_LIST = {"field": "user_id", "operator": "in", "value": WHITELIST_VALUES}
+EQUALS = {"field": "email", "operator": "==", "value": "admin@example.com"}
+# 大量条件组：每组都不满足，需要计算全部分组（最坏情况）
+MANY_GROUPS = [
+    {"logic": "and", "conditions": [
+        {"field": "email", "operator": "==", "value": f"owner-{i}@example.com"},
+        {"field": "user_id", "operator": "%", "value": 100, "comparator": "==", "target": 100},
+    ]}
+    for i in range(GROUP_COUNT)
+]
+
+PROJECT_DOC = {
+    "_id": "0" * 24,
+    "name": PROJECT,
+    "items": [
+        {"name": "rollout", "enabled": True, "value": "v2", "conditions": [],
+         "condition_groups": [{"logic": "and", "conditions": [ROLLOUT]}]},
+        {"name": "whitelist", "enabled": True, "value": "beta", "conditions": [],
+         "condition_groups": [{"logic": "or", "conditions": [WHITELIST_STR, EQUALS]}]},
+        {"name": "many_groups", "enabled": True, "value": "x", "conditions": [],
+         "condition_groups": MANY_GROUPS},
+        {"name": "api_endpoint", "enabled": True, "value": "https://api.example.com/v2",
+         "conditions": [], "condition_groups": []},
+        {"name": "disabled", "enabled": False, "value": "", "conditions": [], "condition_groups": []},
+    ],
+}
+
+
+# ==================== 工具 ====================
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _latency_summary(latencies: List[float]) -> Dict[str, float]:
+    """延迟分位数（微秒）"""
+    values = sorted(latencies)
+    return {
+        "p50_us": round(_percentile(values, 0.50) * 1e6, 1),
+        "p95_us": round(_percentile(values, 0.95) * 1e6, 1),
+        "p99_us": round(_percentile(values, 0.99) * 1e6, 1),
+        "max_us": round(values[-1] * 1e6, 1) if values else 0.0,
+    }
+
+
+def _result(value: float, unit: str, better: str, **extra) -> Dict[str, Any]:
+    """单项结果：value 为主指标，better 为 "lower" 或 "higher"，用于对比"""
+    return {"value": round(value, 3), "unit": unit, "better": better, **extra}
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT, capture_output=True, text=True, timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _environment() -> Dict[str, Any]:
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "json": f"orjson {orjson.__version__}" if orjson else "json",
+    }
+
+
+# ==================== micro ====================
+
+def _time_per_call(func: Callable[[], Any], repeat: int, min_time: float) -> Dict[str, Any]:
+    """每次调用耗时（纳秒）：先自动确定单轮次数，取多轮中的最小值（受干扰最少）"""
+    timer = timeit.Timer(func)
+    number, elapsed = timer.autorange()
+    number = max(1, int(number * min_time / max(elapsed, 1e-9)))
+    runs = [t / number * 1e9 for t in timer.repeat(repeat=repeat, number=number)]
+    return _result(min(runs), "ns/op", "lower", median=round(statistics.median(runs), 1), number=number)
+
+
+def run_micro(quick: bool) -> Dict[str, Any]:
+    repeat, min_time = (3, 0.05) if quick else (7, 0.2)
+    compiled = compile_project(PROJECT_DOC)
+    rollout_item = compiled.get_item("rollout")
+    whitelist_item = compiled.get_item("whitelist")
+    many_groups_item = compiled.get_item("many_groups")
+    rollout_native_item = compile_item({"name": "rollout_native", "condition_groups": [{"conditions": [ROLLOUT_NATIVE]}]})
+
+    hit = {"user_id": "user-9999", "email": "someone@example.com"}
+    miss = {"user_id": "user-x", "email": "someone@example.com"}
+    long_email = "a.very.long.mailbox.name+tag@subdomain.example.com"
+
+    cases: Dict[str, Callable[[], Any]] = {
+        "hash_field/short": lambda: hash_field("user-12345"),
+        "hash_field/long": lambda: hash_field(long_email),
+        "get_hashed_value/lru_hit": lambda: get_hashed_value("user_id", "user-12345"),
+        "evaluate_condition/rollout": lambda: evaluate_condition(ROLLOUT, hit),
+        "evaluate_condition/rollout_native": lambda: evaluate_condition(ROLLOUT_NATIVE, hit),
+        "evaluate_condition/equals": lambda: evaluate_condition(EQUALS, hit),
+        f"evaluate_condition/whitelist_str_{WHITELIST_SIZE}/hit": lambda: evaluate_condition(WHITELIST_STR, hit),
+        f"evaluate_condition/whitelist_str_{WHITELIST_SIZE}/miss": lambda: evaluate_condition(WHITELIST_STR, miss),
+        f"evaluate_condition/whitelist_list_{WHITELIST_SIZE}/hit": lambda: evaluate_condition(WHITELIST_LIST, hit),
+        f"evaluate_condition_groups/{GROUP_COUNT}_groups": lambda: evaluate_condition_groups(MANY_GROUPS, hit),
+        "compiled/rollout": lambda: rollout_item.evaluate(hit),
+        "compiled/rollout_native": lambda: rollout_native_item.evaluate(hit),
+        f"compiled/whitelist_{WHITELIST_SIZE}/hit": lambda: whitelist_item.evaluate(hit),
+        f"compiled/whitelist_{WHITELIST_SIZE}/miss": lambda: whitelist_item.evaluate(miss),
+        f"compiled/{GROUP_COUNT}_groups": lambda: many_groups_item.evaluate(hit),
+    }
+
+    results = {}
+    for name, func in cases.items():
+        results[name] = _time_per_call(func, repeat, min_time)
+        print(f"  {name}: {results[name]['value']:,.0f} ns/op")
+    return results
+
+
+# ==================== endpoints ====================
+
+class _BenchApp:
+    """应用 + 内存数据库，缓存与依赖在进入时重置，退出时恢复"""
+
+    def __init__(self, db_latency: float):
+        self.db = InMemoryDatabase(latency=db_latency)
+        self.db.projects.insert(PROJECT_DOC)
+
+    async def __aenter__(self) -> "_BenchApp":
+        cache.clear_all_cache()
+        app.dependency_overrides[get_db] = lambda: self.db
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.client.aclose()
+        app.dependency_overrides.pop(get_db, None)
+        cache.clear_all_cache()
+
+
+def _ensure_ok(response: httpx.Response):
+    """错误状态码说明场景配置有误，直接中止（304 属于正常结果）"""
+    if response.status_code >= 400:
+        raise RuntimeError(f"{response.request.url} 返回 {response.status_code}: {response.text}")
+
+
+async def _sequential(
+    send: Callable[[int], Any],
+    requests: int,
+    before: Optional[Callable[[], None]] = None
+) -> Dict[str, Any]:
+    """顺序请求，返回吞吐与延迟分位数"""
+    for i in range(min(100, requests)):  # 预热
+        if before:
+            before()
+        _ensure_ok(await send(i))
+    latencies = []
+    total = 0.0
+    for i in range(requests):
+        if before:
+            before()
+        start = time.perf_counter()
+        response = await send(i)
+        elapsed = time.perf_counter() - start
+        _ensure_ok(response)
+        latencies.append(elapsed)
+        total += elapsed
+    return _result(requests / total, "req/s", "higher", **_latency_summary(latencies))
+
+
+async def run_endpoints(quick: bool, db_latency: float) -> Dict[str, Any]:
+    requests = 1000 if quick else 5000
+    users = [f"user-{i}" for i in range(1000)]
+
+    async with _BenchApp(db_latency) as bench:
+        client = bench.client
+
+        def check(key: str):
+            return lambda i: client.get("/api/fg/check", params={"project": PROJECT, "key": key, "user_id": users[i % len(users)]})
+
+        def miss():
+            cache.invalidate_cache(PROJECT)
+
+        evaluate_all_body = {"project": PROJECT, "user_id": "user-1"}
+        config_etag = (await client.get("/api/fg/config", params={"project": PROJECT})).headers["etag"]
+
+        scenarios = {
+            "check/rollout/hit": (check("rollout"), None),
+            "check/whitelist/hit": (check("whitelist"), None),
+            f"check/{GROUP_COUNT}_groups/hit": (check("many_groups"), None),
+            "check/rollout/miss": (check("rollout"), miss),
+            "check_post/rollout/hit": (lambda i: client.post("/api/fg/check", json={"project": PROJECT, "key": "rollout", "user_id": users[i % len(users)]}), None),
+            "get/hit": (lambda i: client.get("/api/fg/get", params={"project": PROJECT, "key": "api_endpoint"}), None),
+            "evaluate_all/hit": (lambda i: client.post("/api/fg/evaluate_all", json=evaluate_all_body), None),
+            "config/304": (lambda i: client.get("/api/fg/config", params={"project": PROJECT}, headers={"If-None-Match": config_etag}), None),
+        }
+
+        results = {}
+        for name, (send, before) in scenarios.items():
+            results[name] = await _sequential(send, requests, before)
+            r = results[name]
+            print(f"  {name}: {r['value']:,.0f} req/s, p50 {r['p50_us']:,.0f} µs, p99 {r['p99_us']:,.0f} µs")
+    return results
+
+
+# ==================== load ====================
+
+async def run_load(quick: bool, db_latency: float, concurrency: int, invalidate_interval: float) -> Dict[str, Any]:
+    requests = 5000 if quick else 30000
+    keys = ["rollout", "whitelist", "many_groups", "api_endpoint"]
+    rng = random.Random(42)
+    queries = [
+        {"project": PROJECT, "key": keys[i % len(keys)], "user_id": f"user-{rng.randrange(100000)}"}
+        for i in range(requests)
+    ]
+
+    async with _BenchApp(db_latency) as bench:
+        client, db = bench.client, bench.db
+        await client.get("/api/fg/check", params=queries[0])  # 预热
+        db.projects.find_count = 0
+
+        latencies: List[float] = []
+        errors = 0
+        cursor = iter(range(requests))
+        done = asyncio.Event()
+
+        async def worker():
+            nonlocal errors
+            for i in cursor:
+                start = time.perf_counter()
+                response = await client.get("/api/fg/check", params=queries[i])
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors += 1
+
+        async def invalidator() -> int:
+            """周期性使项目缓存失效，模拟配置变更"""
+            count = 0
+            while not done.is_set():
+                try:
+                    await asyncio.wait_for(done.wait(), invalidate_interval)
+                except asyncio.TimeoutError:
+                    cache.invalidate_cache(PROJECT)
+                    count += 1
+            return count
+
+        invalidations = asyncio.create_task(invalidator()) if invalidate_interval > 0 else None
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        invalidation_count = await invalidations if invalidations else 0
+
+    result = _result(
+        requests / elapsed, "req/s", "higher",
+        concurrency=concurrency,
+        requests=requests,
+        errors=errors,
+        invalidations=invalidation_count,
+        db_queries=db.projects.find_count,
+        **_latency_summary(latencies)
+    )
+    name = f"check/concurrency_{concurrency}"
+    print(
+        f"  {name}: {result['value']:,.0f} req/s, p50 {result['p50_us']:,.0f} µs, p99 {result['p99_us']:,.0f} µs, "
+        f"失效 {invalidation_count} 次, 数据库查询 {result['db_queries']} 次, 错误 {errors}"
+    )
+    return {name: result}
+
+
+# ==================== 对比 ====================
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> int:
+    """打印两次结果的对比，返回退化项数量（变差超过 threshold 的指标）"""
+    print(f"基线: {baseline['environment'].get('git_commit')} {baseline['environment'].get('timestamp')}")
+    print(f"当前: {current['environment'].get('git_commit')} {current['environment'].get('timestamp')}")
+    regressions = 0
+    for layer, results in current["results"].items():
+        base_results = baseline["results"].get(layer, {})
+        for name, result in results.items():
+            base = base_results.get(name)
+            if base is None or not base["value"]:
+                print(f"  {layer}/{name}: {result['value']:,.1f} {result['unit']}（基线中没有）")
+                continue
+            change = result["value"] / base["value"] - 1
+            worse = -change if result["better"] == "higher" else change
+            marker = ""
+            if worse > threshold:
+                marker = "  <-- 退化"
+                regressions += 1
+            print(
+                f"  {layer}/{name}: {base['value']:,.1f} -> {result['value']:,.1f} {result['unit']} "
+                f"({change:+.1%}){marker}"
+            )
+    return regressions
+
+
+def _load_results(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Feature Gate 基准测试套件")
+    parser.add_argument("--layers", default="micro,endpoints,load", help="要运行的层，逗号分隔：micro,endpoints,load")
+    parser.add_argument("--quick", action="store_true", help="缩短运行时间（结果波动更大）")
+    parser.add_argument("--output", help="结果 JSON 路径（默认 benchmarks/results/<时间>.json）")
+    parser.add_argument("--compare", nargs="+", metavar="JSON", help="与基线对比；给出两个文件时只对比、不运行")
+    parser.add_argument("--threshold", type=float, default=0.10, help="对比时判定退化的比例（默认 0.10）")
+    parser.add_argument("--db-latency-ms", type=float, default=1.0, help="内存数据库每次查询模拟的延迟（毫秒）")
+    parser.add_argument("--concurrency", type=int, default=50, help="load 层的并发客户端数")
+    parser.add_argument("--invalidate-interval", type=float, default=0.05, help="load 层缓存失效间隔（秒），0 为不失效")
+    args = parser.parse_args()
+
+    if args.compare and len(args.compare) == 2:
+        regressions = compare(_load_results(args.compare[0]), _load_results(args.compare[1]), args.threshold)
+        sys.exit(1 if regressions else 0)
+
+    layers = [layer.strip() for layer in args.layers.split(",") if layer.strip()]
+    db_latency = args.db_latency_ms / 1000
+    output = {"environment": _environment(), "options": vars(args), "results": {}}
+
+    for layer in layers:
+        print(f"[{layer}]")
+        if layer == "micro":
+            output["results"][layer] = run_micro(args.quick)
+        elif layer == "endpoints":
+            output["results"][layer] = await run_endpoints(args.quick, db_latency)
+        elif layer == "load":
+            output["results"][layer] = await run_load(args.quick, db_latency, args.concurrency, args.invalidate_interval)
+        else:
+            parser.error(f"未知的层: {layer}")
+
+    path = args.output or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(output, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {path}")
+
+    if args.compare:
+        regressions = compare(_load_results(args.compare[0]), output, args.threshold)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
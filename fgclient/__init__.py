@@ -0,0 +1,4 @@
+"""Feature Gate 本地计算客户端"""
+from fgclient.client import FeatureGateClient
+
+__all__ = ["FeatureGateClient"]
@@ -0,0 +1,277 @@
+"""本地计算的 Feature Gate 客户端
+
+从 /api/fg/config 下载项目的规范化配置，在进程内编译后本地计算，
+每次检查只是内存中的谓词调用（微秒级），不再经过网络。
+
+- 后台线程按 poll_interval 轮询，带 If-None-Match，配置未变化时服务端返回 304；
+  stream=True 时改为订阅 /api/fg/stream（SSE），配置变更在一秒内推送到本地，断线后自动重连
+- 拉取失败时继续使用最后一次成功的配置；可选 cache_path 将配置落盘，
+  进程启动时服务端不可用也能从文件恢复
+- 编译与计算直接复用服务端的 app.services.compiler（哈希与 app.services.hash 相同），
+  结果与 /api/fg/check、/api/fg/get 一致
+"""
+import json
+import os
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from typing import Any, Dict, Optional
+
+from app.services.compiler import CompiledProject, compile_project
+
+
+class FeatureGateClient:
+    """
+    用法：
+        client = FeatureGateClient("http://localhost:8000", "main")
+        if client.is_enabled("new_chat_ui", user_id=user_id):
+            ...
+        client.close()
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        project: str,
+        poll_interval: float = 10.0,
+        timeout: float = 5.0,
+        cache_path: Optional[str] = None,
+        stream: bool = False,
+        start: bool = True
+    ):
+        """
+        Args:
+            base_url: FG 服务地址，例如 http://localhost:8000
+            project: 项目名称
+            poll_interval: 轮询间隔（秒）；stream=True 时为断线重连间隔
+            timeout: 单次请求超时（秒）
+            cache_path: 配置落盘路径（可选），服务端不可用时从该文件恢复
+            stream: 是否通过 SSE 接收推送（替代轮询）
+            start: 是否立即拉取一次配置并启动后台轮询
+        """
+        self.base_url = base_url.rstrip("/")
+        self.project = project
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.cache_path = cache_path
+        self.stream = stream
+
+        self._compiled: Optional[CompiledProject] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stream_response = None
+
+        if cache_path:
+            self._load_cache_file()
+        if start:
+            self.start()
+
+    @property
+    def version(self) -> Optional[str]:
+        """当前配置版本号，还没有配置时为 None"""
+        compiled = self._compiled
+        return compiled.version if compiled else None
+
+    @property
+    def ready(self) -> bool:
+        """是否已有可用配置"""
+        return self._compiled is not None
+
+    def refresh(self) -> bool:
+        """
+        拉取一次配置
+
+        Returns:
+            配置是否有更新（304 返回 False）
+
+        Raises:
+            OSError: 网络错误或服务端返回错误状态码（urllib.error.URLError / HTTPError）
+        """
+        request = urllib.request.Request(self._url("config"), headers={"Accept": "application/json"})
+        current = self._compiled
+        if current is not None:
+            request.add_header("If-None-Match", f'"{current.version}"')
+
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                body = response.read()
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return False
+            raise
+
+        self._install_body(body)
+        return True
+
+    def start(self):
+        """立即拉取一次配置，并启动后台轮询线程"""
+        if self._thread is not None:
+            return
+        self._safe_refresh()
+        target = self._stream_loop if self.stream else self._poll_loop
+        self._thread = threading.Thread(target=target, name=f"fgclient-{self.project}", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """停止后台轮询 / 订阅"""
+        self._stop.set()
+        response = self._stream_response
+        if response is not None:
+            # 中断阻塞中的读取
+            try:
+                response.close()
+            except Exception:
+                pass
+        if self._thread is not None:
+            self._thread.join(timeout=self.timeout + 1)
+            self._thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def is_enabled(
+        self,
+        key: str,
+        user_id: Optional[str] = None,
+        chat_id: Optional[str] = None,
+        email: Optional[str] = None,
+        default: bool = False
+    ) -> bool:
+        """检查功能是否对特定用户生效（与 /api/fg/check 一致），没有配置或 key 不存在时返回 default"""
+        compiled = self._compiled
+        item = compiled.get_item(key) if compiled else None
+        if item is None:
+            return default
+        return item.evaluate(_build_context(user_id, chat_id, email))
+
+    def get_value(self, key: str, default: str = "") -> str:
+        """获取功能配置值（与 /api/fg/get 一致，item 关闭时为空字符串），没有配置或 key 不存在时返回 default"""
+        compiled = self._compiled
+        item = compiled.get_item(key) if compiled else None
+        if item is None:
+            return default
+        return item.value if item.enabled else ""
+
+    def evaluate_all(
+        self,
+        user_id: Optional[str] = None,
+        chat_id: Optional[str] = None,
+        email: Optional[str] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """计算所有 item（与 /api/fg/evaluate_all 一致）：{名称: {"enabled", "value"}}"""
+        compiled = self._compiled
+        if compiled is None:
+            return {}
+        context = _build_context(user_id, chat_id, email)
+        hashes: Dict[str, int] = {}  # 所有 item 共享，每个字段只哈希一次
+        results = {}
+        for item in compiled.items.values():
+            if not item.enabled:
+                results[item.name] = {"enabled": False, "value": ""}
+            else:
+                results[item.name] = {"enabled": item.evaluate(context, hashes), "value": item.value}
+        return results
+
+    def _url(self, endpoint: str) -> str:
+        return f"{self.base_url}/api/fg/{endpoint}?{urllib.parse.urlencode({'project': self.project})}"
+
+    def _install_body(self, body: bytes):
+        """安装服务端返回的配置（JSON 字节串），并按需落盘"""
+        self._install(json.loads(body))
+        if self.cache_path:
+            self._write_cache_file(body)
+
+    def _install(self, config: Dict[str, Any]):
+        """编译配置并整体替换（读取方无需加锁）"""
+        self._compiled = compile_project({
+            "name": config.get("project", self.project),
+            "items": config.get("items", []),
+        })
+
+    def _safe_refresh(self):
+        try:
+            self.refresh()
+        except (OSError, ValueError) as e:
+            # 保留最后一次成功的配置
+            print(f"拉取 Feature Gate 配置失败 {self.project}: {e}")
+
+    def _poll_loop(self):
+        while not self._stop.wait(self.poll_interval):
+            self._safe_refresh()
+
+    def _stream_loop(self):
+        while not self._stop.is_set():
+            try:
+                self._consume_stream()
+            except (OSError, ValueError) as e:
+                if not self._stop.is_set():
+                    print(f"Feature Gate 配置推送中断 {self.project}: {e}")
+            self._stop.wait(self.poll_interval)
+
+    def _consume_stream(self):
+        """读取 SSE 事件流直到断开；连接时服务端会先推送当前配置（版本未变化时跳过）"""
+        request = urllib.request.Request(self._url("stream"), headers={"Accept": "text/event-stream"})
+        current = self._compiled
+        if current is not None:
+            request.add_header("Last-Event-ID", current.version)
+
+        # 服务端定期发送心跳，读取超时说明连接已失效
+        with urllib.request.urlopen(request, timeout=max(self.timeout, 60)) as response:
+            self._stream_response = response
+            try:
+                event_type, data = "message", []
+                for raw_line in response:
+                    if self._stop.is_set():
+                        return
+                    line = raw_line.decode().rstrip("\r\n")
+                    if not line:
+                        if event_type == "config" and data:
+                            self._install_body("\n".join(data).encode())
+                        elif event_type == "deleted":
+                            # 项目已删除，保留最后的配置
+                            print(f"Feature Gate 项目已删除 {self.project}")
+                        event_type, data = "message", []
+                    elif line.startswith(":"):
+                        continue
+                    elif line.startswith("event:"):
+                        event_type = line[6:].strip()
+                    elif line.startswith("data:"):
+                        data.append(line[5:].lstrip(" "))
+            finally:
+                self._stream_response = None
+
+    def _load_cache_file(self):
+        try:
+            with open(self.cache_path, "rb") as f:
+                self._install(json.loads(f.read()))
+        except (OSError, ValueError):
+            pass
+
+    def _write_cache_file(self, body: bytes):
+        tmp_path = f"{self.cache_path}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(body)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            print(f"写入 Feature Gate 配置缓存失败 {self.cache_path}: {e}")
+
+
+def _build_context(
+    user_id: Optional[str],
+    chat_id: Optional[str],
+    email: Optional[str]
+) -> Dict[str, str]:
+    """构建条件计算上下文（与服务端一致，空值视为没有该字段）"""
+    context = {}
+    if user_id:
+        context["user_id"] = user_id
+    if chat_id:
+        context["chat_id"] = chat_id
+    if email:
+        context["email"] = email
+    return context
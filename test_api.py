@@ -16,7 +16,8 @@ async def test_basic_functionality():
         from app.services.auth import get_password_hash, verify_password
         from app.services.hash import hash_user_id, hash_chat_id
         from app.services.evaluator import evaluate_condition, evaluate_conditions
-        from app.services.cache import get_cached_item, set_cached_item
+        from app.services.cache import get_cached_item, get_cached_project, set_cached_project
+        from app.services.compiler import compile_project
         print("  ✓ 所有模块导入成功")
     except Exception as e:
         print(f"  ✗ 模块导入失败: {e}")
@@ -99,12 +100,13 @@ async def test_basic_functionality():
     try:
         project = "test_project"
         key = "test_key"
-        data = {"enabled": True, "conditions": []}
+        data = compile_project({"name": project, "items": [{"name": key, "enabled": True, "conditions": []}]})
         
-        set_cached_item(project, key, data)
-        cached = get_cached_item(project, key)
+        set_cached_project(project, data)
+        assert get_cached_project(project) is data
+        cached = get_cached_item(project, key.upper())
         
-        assert cached == data
+        assert cached is data.get_item(key) and cached.enabled
         print(f"  - 缓存写入: ✓")
         print(f"  - 缓存读取: ✓")
         print("  ✓ 缓存功能正常")
@@ -0,0 +1,171 @@
+"""项目缓存并发测试：single-flight、负缓存、加载期间失效、stale-while-revalidate"""
+import asyncio
+import pytest
+from app.services import cache
+from app.services.compiler import CompiledProject, compile_project
+
+
+def _project(name: str, value: str = "v1", project_id: str = "p1") -> CompiledProject:
+    return compile_project({
+        "_id": project_id,
+        "name": name,
+        "items": [{"name": "flag", "enabled": True, "value": value, "conditions": [], "condition_groups": []}],
+    })
+
+
+class Loader:
+    """可控的 loader：记录调用次数，在 release() 之前一直阻塞"""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = 0
+        self.started = asyncio.Event()
+        self._release = asyncio.Event()
+
+    def release(self):
+        self._release.set()
+
+    async def __call__(self, name: str):
+        self.calls += 1
+        self.started.set()
+        await self._release.wait()
+        return self.results[min(self.calls, len(self.results)) - 1]
+
+
+@pytest.fixture(autouse=True)
+def clean_cache():
+    cache.clear_all_cache()
+    cache._project_names_by_id.clear()
+    yield
+    cache.clear_all_cache()
+    cache._project_names_by_id.clear()
+
+
+def test_concurrent_misses_share_one_load():
+    async def main():
+        project = _project("demo")
+        loader = Loader(project)
+        waiters = [asyncio.ensure_future(cache.get_or_load_project("demo", loader)) for _ in range(20)]
+        await loader.started.wait()
+        loader.release()
+        results = await asyncio.gather(*waiters)
+        assert loader.calls == 1
+        assert all(result is project for result in results)
+        assert cache.get_cached_project("demo") is project
+        assert not cache._inflight_loads
+
+    asyncio.run(main())
+
+
+def test_missing_project_is_negatively_cached():
+    async def main():
+        loader = Loader(None)
+        loader.release()
+        assert await cache.get_or_load_project("nope", loader) is None
+        assert await cache.get_or_load_project("nope", loader) is None
+        assert loader.calls == 1
+        assert "nope" in cache.missing_project_cache
+
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_does_not_cancel_shared_load():
+    async def main():
+        project = _project("demo")
+        loader = Loader(project)
+        first = asyncio.ensure_future(cache.get_or_load_project("demo", loader))
+        second = asyncio.ensure_future(cache.get_or_load_project("demo", loader))
+        await loader.started.wait()
+        first.cancel()
+        loader.release()
+        assert await second is project
+        assert first.cancelled()
+        assert cache.get_cached_project("demo") is project
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize("invalidate", [
+    lambda: cache.invalidate_cache("demo"),
+    cache.clear_all_cache,
+])
+def test_invalidate_during_load_discards_stale_result(invalidate):
+    async def main():
+        stale, fresh = _project("demo", "old"), _project("demo", "new")
+        loader = Loader(stale, fresh)
+        waiter = asyncio.ensure_future(cache.get_or_load_project("demo", loader))
+        await loader.started.wait()
+
+        # 加载期间配置被保存：进行中的加载结果不能写回缓存
+        invalidate()
+        assert not cache._inflight_loads
+        loader.release()
+        assert await waiter is stale  # 已在等待的请求仍拿到结果
+        assert cache.get_cached_project("demo") is None
+
+        # 之后的请求发起新的加载
+        assert await cache.get_or_load_project("demo", loader) is fresh
+        assert loader.calls == 2
+        assert cache.get_cached_project("demo") is fresh
+
+    asyncio.run(main())
+
+
+def test_invalidate_during_load_while_new_load_finishes_first():
+    async def main():
+        stale, fresh = _project("demo", "old"), _project("demo", "new")
+        old_loader, new_loader = Loader(stale), Loader(fresh)
+        old_waiter = asyncio.ensure_future(cache.get_or_load_project("demo", old_loader))
+        await old_loader.started.wait()
+        cache.invalidate_cache("demo")
+
+        new_loader.release()
+        assert await cache.get_or_load_project("demo", new_loader) is fresh
+
+        # 旧的加载在新的加载之后才结束，也不能覆盖新快照
+        old_loader.release()
+        assert await old_waiter is stale
+        assert cache.get_cached_project("demo") is fresh
+
+    asyncio.run(main())
+
+
+def test_stale_entry_is_served_while_refreshing():
+    async def main():
+        old, new = _project("demo", "old"), _project("demo", "new")
+        cache.set_cached_project("demo", old)
+        cache.project_cache["demo"].refresh_at = 0  # 已软过期
+
+        loader = Loader(new)
+        assert await cache.get_or_load_project("demo", loader) is old
+        assert await cache.get_or_load_project("demo", loader) is old
+        await loader.started.wait()
+        assert loader.calls == 1  # 只发起一次后台刷新
+
+        loader.release()
+        await asyncio.sleep(0)
+        assert cache.get_cached_project("demo") is new
+
+    asyncio.run(main())
+
+
+def test_unknown_names_do_not_accumulate_state():
+    async def main():
+        loader = Loader(None)
+        loader.release()
+        for i in range(100):
+            name = f"unknown-{i}"
+            await cache.get_or_load_project(name, loader)
+            cache.invalidate_cache(name)
+        assert not cache._inflight_loads
+        assert len(cache._project_names_by_id) == 0
+        assert len(cache.missing_project_cache) == 0
+
+    asyncio.run(main())
+
+
+def test_invalidate_by_id():
+    cache.set_cached_project("demo", _project("demo", project_id="abc"))
+    assert cache.invalidate_cache_by_id("abc") == "demo"
+    assert cache.get_cached_project("demo") is None
+    assert cache.invalidate_cache_by_id("abc") is None
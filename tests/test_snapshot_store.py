@@ -0,0 +1,187 @@
+"""快照存储编码测试：差异往返、基准间隔、去重"""
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+import yaml
+from mongomock_motor import AsyncMongoMockClient
+from app.routers.snapshots import build_snapshot_content, build_snapshot_header, build_snapshot_yaml
+from app.services import snapshot_store
+from app.services.snapshot_store import (
+    ENCODING_DELTA,
+    ENCODING_FULL,
+    ENCODING_REF,
+    apply_delta,
+    encode_snapshot,
+    load_snapshot_content,
+    load_snapshot_yaml,
+    make_delta,
+)
+
+PROJECT_ID = "0" * 24
+
+
+def _project(whitelist_size: int = 2000, extra_ids=(), enabled: bool = True) -> dict:
+    whitelist = ",".join([f"user_{n}" for n in range(whitelist_size)] + list(extra_ids))
+    return {
+        "_id": PROJECT_ID,
+        "name": "demo",
+        "created_at": datetime(2024, 1, 1),
+        "items": [{
+            "name": "new_chat_ui",
+            "description": "新版聊天界面",
+            "enabled": enabled,
+            "value": "",
+            "conditions": [],
+            "condition_groups": [{"logic": "or", "conditions": [
+                {"field": "user_id", "operator": "in", "value": whitelist, "comparator": None, "target": None},
+            ]}],
+        }],
+    }
+
+
+class Store:
+    """按 create_snapshot 的方式写入快照（encode_snapshot + insert_one）"""
+
+    def __init__(self):
+        self.db = AsyncMongoMockClient()["test"]
+        self.now = datetime(2024, 1, 1)
+
+    async def save(self, content: str, remark: str = "", updated_by: str = "admin") -> dict:
+        self.now += timedelta(seconds=1)
+        snapshot = {
+            "project_id": PROJECT_ID,
+            "updated_by": updated_by,
+            "updated_at": self.now,
+            "remark": remark,
+            **(await encode_snapshot(self.db, PROJECT_ID, content)),
+        }
+        result = await self.db.snapshots.insert_one(snapshot)
+        snapshot["_id"] = result.inserted_id
+        return snapshot
+
+    async def read(self, snapshot: dict) -> str:
+        # 从数据库重新读取，确认还原只依赖存储的字段
+        stored = await self.db.snapshots.find_one({"_id": snapshot["_id"]})
+        header = build_snapshot_header(stored.get("remark", ""), stored["updated_by"])
+        return await load_snapshot_yaml(self.db, stored, header)
+
+
+@pytest.fixture(autouse=True)
+def full_interval(monkeypatch):
+    monkeypatch.setattr(snapshot_store.settings, "snapshot_full_interval", 3)
+    snapshot_store._base_cache.clear()
+    yield
+    snapshot_store._base_cache.clear()
+
+
+@pytest.mark.parametrize("base,new", [
+    ("", "a: 1\n"),
+    ("a: 1\n", ""),
+    ("ids: u1,u2,u3\n", "ids: u1,u3,u4\n"),
+    ("x y z\n", "z y x\n"),
+    ("ids: u1,u2\nname: demo\n", "name: demo\nids: u1,u2,u2\n"),
+])
+def test_delta_round_trip(base, new):
+    assert apply_delta(base, make_delta(base, new)) == new
+
+
+def test_whitelist_edit_is_a_small_delta():
+    base = build_snapshot_content(_project())
+    new = build_snapshot_content(_project(extra_ids=["user_new"]))
+    ops = make_delta(base, new)
+    assert apply_delta(base, ops) == new
+    # 只有最后一个 ID（分隔符由换行变为逗号）和新增的 ID 作为新文本保存
+    assert [op for op in ops if isinstance(op, str)] == ["user_1999,user_new\n"]
+
+
+def test_split_yaml_matches_single_dump():
+    project = _project(whitelist_size=10)
+    combined = {
+        "snapshot": {"updated_by": "admin", "remark": "备注"},
+        "project": {"id": PROJECT_ID, "name": "demo", "created_at": "2024-01-01T00:00:00"},
+        "items": project["items"],
+    }
+    expected = yaml.dump(combined, Dumper=yaml.SafeDumper, allow_unicode=True, sort_keys=False)
+    assert build_snapshot_yaml(project, "备注", "admin") == expected
+
+
+def test_full_delta_full_round_trip():
+    async def main():
+        store = Store()
+        contents = [build_snapshot_content(_project(extra_ids=[f"added_{i}"])) for i in range(5)]
+        snapshots = [await store.save(content, remark=f"第 {i} 次") for i, content in enumerate(contents)]
+
+        # snapshot_full_interval = 3：基准、两个差异，然后重新保存基准
+        assert [s["encoding"] for s in snapshots] == [
+            ENCODING_FULL, ENCODING_DELTA, ENCODING_DELTA, ENCODING_FULL, ENCODING_DELTA,
+        ]
+        assert [s["chain"] for s in snapshots] == [0, 1, 2, 0, 1]
+        assert snapshots[1]["base_id"] == snapshots[2]["base_id"] == snapshots[0]["_id"]
+        assert snapshots[4]["base_id"] == snapshots[3]["_id"]
+        assert len(snapshots[1]["data"]) < len(snapshots[0]["data"]) * snapshot_store.MAX_DELTA_RATIO
+
+        for i, (snapshot, content) in enumerate(zip(snapshots, contents)):
+            assert await store.read(snapshot) == build_snapshot_header(f"第 {i} 次", "admin") + content
+
+    asyncio.run(main())
+
+
+def test_unrelated_content_falls_back_to_full():
+    async def main():
+        store = Store()
+        await store.save(build_snapshot_content(_project(whitelist_size=0)))
+        unrelated_ids = [f"{n * 7919 % 100003:x}" for n in range(2000)]
+        other = await store.save(build_snapshot_content(_project(whitelist_size=0, extra_ids=unrelated_ids)))
+        assert other["encoding"] == ENCODING_FULL
+
+    asyncio.run(main())
+
+
+def test_unchanged_project_is_deduplicated_despite_new_metadata():
+    async def main():
+        store = Store()
+        content = build_snapshot_content(_project())
+        changed = build_snapshot_content(_project(enabled=False))
+
+        first = await store.save(content, remark="上线", updated_by="alice")
+        delta = await store.save(changed, remark="关闭")
+        again = await store.save(content, remark="重新打开", updated_by="bob")
+        delta_again = await store.save(changed, remark="再次关闭", updated_by="carol")
+
+        assert again["encoding"] == ENCODING_REF
+        assert again["base_id"] == first["_id"]
+        assert "data" not in again
+        assert delta["encoding"] == ENCODING_DELTA
+        assert delta_again["encoding"] == ENCODING_REF
+        assert delta_again["base_id"] == delta["_id"]
+
+        # 引用只共享内容，元数据来自各自的快照
+        assert await store.read(again) == build_snapshot_header("重新打开", "bob") + content
+        assert await store.read(delta_again) == build_snapshot_header("再次关闭", "carol") + changed
+        assert await load_snapshot_content(store.db, again) == content
+
+    asyncio.run(main())
+
+
+def test_legacy_plain_snapshot_is_read_as_is_and_serves_as_base():
+    async def main():
+        store = Store()
+        project = _project()
+        legacy_yaml = build_snapshot_yaml(project, "旧版", "admin")
+        result = await store.db.snapshots.insert_one({
+            "project_id": PROJECT_ID,
+            "updated_by": "admin",
+            "updated_at": store.now,
+            "remark": "旧版",
+            "yaml": legacy_yaml,
+        })
+        legacy = await store.db.snapshots.find_one({"_id": result.inserted_id})
+        assert await store.read(legacy) == legacy_yaml
+
+        content = build_snapshot_content(_project(extra_ids=["user_new"]))
+        snapshot = await store.save(content, remark="新版")
+        assert snapshot["encoding"] == ENCODING_DELTA
+        assert snapshot["base_id"] == legacy["_id"]
+        assert await store.read(snapshot) == build_snapshot_header("新版", "admin") + content
+
+    asyncio.run(main())